@@ -1,22 +1,52 @@
 import os
-from flask import Flask
+import importlib
+from types import MappingProxyType
+from flask import Flask, Response, redirect, url_for, render_template, request
+from flask_login import current_user
 from config import Config
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Caminhos resolvidos uma única vez
+_ROOT = Path(__file__).resolve().parents[1]
+_ENV_PATH = _ROOT / 'config.env'
+
 # Carrega variáveis do arquivo config.env
-_env_path = Path(__file__).resolve().parents[1] / 'config.env'
-if _env_path.exists():
-    load_dotenv(dotenv_path=_env_path, override=True)
+# (processos filhos do reloader herdam o ambiente e não precisam reler o arquivo)
+if not os.environ.get('_DOTENV_LOADED') and _ENV_PATH.exists():
+    load_dotenv(dotenv_path=_ENV_PATH, override=True)
+    os.environ['_DOTENV_LOADED'] = '1'
+
+# Corpo fixo do health check (serializado uma única vez)
+_HEALTH_BODY = b'{"service":"revisoes_juridicas","status":"ok"}\n'
+
+# Contexto de template para visitantes não autenticados (compartilhado, somente leitura)
+_ANON_CONTEXT = MappingProxyType({'current_user': None, 'user_name': None, 'user_email': None})
+
+# Blueprints registrados pela aplicação: (módulo, prefixo de URL, isento de CSRF)
+# documents só tem rotas GET de download, sem efeito colateral
+_BLUEPRINTS = (
+    ('app.blueprints.auth.routes', '/auth', False),
+    ('app.blueprints.reviews.routes', '/reviews', False),
+    ('app.blueprints.documents.routes', '/documents', True),
+    ('app.blueprints.settings.routes', '/settings', False),
+)
 
 
 def create_app(config_object: type[Config] | None = None) -> Flask:
     """Application factory to create and configure the Flask app."""
-    base_templates = os.path.join(os.path.dirname(__file__), '..', 'templates')
-    base_static = os.path.join(os.path.dirname(__file__), '..', 'static')
+    base_templates = str(_ROOT / 'templates')
+    base_static = str(_ROOT / 'static')
 
     app = Flask(__name__, template_folder=base_templates, static_folder=base_static)
+    # Uploads grandes são recebidos direto na pasta de anexos (sem cópia ao salvar)
+    from .utils.file_upload import UploadRequest
+    app.request_class = UploadRequest
 
+    # Respostas JSON (jsonify) serializadas com orjson
+    from .utils.json_provider import OrjsonProvider
+    app.json = OrjsonProvider(app)
+    
     if config_object is None:
         config_object = Config
     app.config.from_object(config_object)
@@ -24,10 +54,9 @@ def create_app(config_object: type[Config] | None = None) -> Flask:
     # Validar SECRET_KEY após carregar configuração
     secret_key = app.config.get('SECRET_KEY')
     if not secret_key:
-        _env_path = Path(__file__).resolve().parents[1] / 'config.env'
         raise ValueError(
             f"SECRET_KEY não encontrada. "
-            f"Configure SECRET_KEY no arquivo config.env ({_env_path}) ou como variável de ambiente."
+            f"Configure SECRET_KEY no arquivo config.env ({_ENV_PATH}) ou como variável de ambiente."
         )
     if len(secret_key) < 32:
         raise ValueError(
@@ -49,7 +78,24 @@ def create_app(config_object: type[Config] | None = None) -> Flask:
     app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
     app.config['SESSION_COOKIE_SAMESITE'] = os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
     app.config['SESSION_COOKIE_NAME'] = 'revisoes_juridicas_session'
+    
+    # Sessão no servidor: o cookie passa a carregar apenas o id da sessão
+    if app.config.get('REDIS_URL'):
+        import redis
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'redis'
+        app.config['SESSION_REDIS'] = redis.from_url(app.config['REDIS_URL'])
+        app.config['SESSION_KEY_PREFIX'] = 'revisoes_juridicas:session:'
+        Session(app)
 
+    # Cache das consultas agregadas (dashboard/aprovações pendentes), invalidado nos POSTs
+    from .cache import init_query_cache
+    init_query_cache(app)
+    
+    # URL base para links absolutos (e-mails e retorno do Connect), resolvida uma única vez
+    from .utils.urls import resolve_reviews_base_url
+    app.config['RESOLVED_REVIEWS_BASE_URL'] = resolve_reviews_base_url(app)
+    
     # Init extensions
     from .extensions import login_manager
     login_manager.init_app(app)
@@ -66,72 +112,83 @@ def create_app(config_object: type[Config] | None = None) -> Flask:
     from .models import load_user  # noqa: F401
 
     # Register blueprints
-    from .blueprints.auth.routes import bp as auth_bp, connect_auth
-    from .blueprints.reviews.routes import bp as reviews_bp
-    from .blueprints.documents.routes import bp as documents_bp
-    from .blueprints.settings.routes import bp as settings_bp
-    
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(reviews_bp, url_prefix='/reviews')
-    app.register_blueprint(documents_bp, url_prefix='/documents')
-    app.register_blueprint(settings_bp, url_prefix='/settings')
+    for module_path, url_prefix, csrf_exempt in _BLUEPRINTS:
+        module = importlib.import_module(module_path)
+        app.register_blueprint(module.bp, url_prefix=url_prefix)
+        if csrf_exempt:
+            csrf.exempt(module.bp)
     
     # Exempt rota de autenticação do Connect (recebe tokens de sistemas externos)
     # Esta rota precisa estar isenta de CSRF pois recebe requisições do Connect
-    csrf.exempt(connect_auth)
+    csrf.exempt('app.blueprints.auth.routes.connect_auth')
     
     # Rota de health check para validação do Connect
     @app.route('/health')
+    @csrf.exempt
     def health_check():
         """Health check endpoint para validação do Connect"""
-        from flask import jsonify
-        return jsonify({'status': 'ok', 'service': 'revisoes_juridicas'}), 200
+        # Corpo pré-serializado; o Response é novo a cada chamada pois os
+        # hooks (after_request/cookies) alteram os headers da resposta
+        return Response(_HEALTH_BODY, status=200, mimetype='application/json')
     
     # Rota raiz - redirecionar para login
     @app.route('/')
+    @csrf.exempt
     def root():
-        from flask import redirect, url_for
-        from flask_login import current_user
         if current_user and current_user.is_authenticated:
             return redirect(url_for('reviews.dashboard'))
         return redirect(url_for('auth.connect_auth'))
     
-    # Security headers
+    # Security headers (pré-calculados uma vez por app)
+    sec_headers = {
+        'X-Content-Type-Options': 'nosniff',
+        'X-Frame-Options': 'DENY',
+        'X-XSS-Protection': '1; mode=block'
+    }
+    no_cache_headers = {
+        'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0',
+        'Pragma': 'no-cache',
+        'Expires': '0'
+    }
+    
     @app.after_request
     def security_headers(response):
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
+        # app.debug é lido por requisição pois o run.py liga o debug em app.run()
+        debug = app.debug
+        
+        # Arquivos estáticos não precisam dos headers de página
+        # (em debug continuam recebendo os headers de no-cache)
+        if request.endpoint == 'static' and not debug:
+            return response
+        
+        response.headers.update(sec_headers)
         
         # Disable cache in development
-        if app.config.get('DEBUG'):
-            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
+        if debug:
+            response.headers.update(no_cache_headers)
         
         return response
     
     # Template helpers
     @app.context_processor
     def inject_user():
-        from flask_login import current_user
         if current_user and current_user.is_authenticated:
+            # Resolve o proxy uma única vez
+            user = current_user._get_current_object()
             return {
-                'current_user': current_user,
-                'user_name': current_user.name,
-                'user_email': current_user.email
+                'current_user': user,
+                'user_name': user.name,
+                'user_email': user.email
             }
-        return {'current_user': None, 'user_name': None, 'user_email': None}
+        return _ANON_CONTEXT
     
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
-        from flask import render_template
         return render_template('errors/404.html'), 404
     
     @app.errorhandler(500)
     def internal_error(error):
-        from flask import render_template
         return render_template('errors/500.html'), 500
     
     return app
@@ -2,11 +2,14 @@
 Rotas de autenticação
 """
 
+import logging
 from flask import Blueprint, request, redirect, url_for, session, flash, current_app
-from flask_login import login_user, logout_user
+from flask_login import login_user, logout_user, current_user
 from app.models import User
 from app.services.token_decryption_service import token_decryption_service
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('auth', __name__)
 
 
@@ -16,23 +19,24 @@ def connect_auth():
     Endpoint de autenticação via token do Connect.
     Recebe token via POST e cria sessão local.
     """
+    # Nos erros o usuário volta para o Connect (outro domínio) e nunca veria um flash;
+    # registrar no log evita gravar _flashes na sessão só para descartá-los
+    connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+    
     if request.method == 'GET':
         # Se já está autenticado, redirecionar
-        from flask_login import current_user
         if current_user and current_user.is_authenticated:
             return redirect(url_for('reviews.dashboard'))
         
         # Se não tem token e não está autenticado, redirecionar para o Connect
         # para evitar loop de redirecionamento (sem mensagem de erro para não interferir no fluxo do Connect)
-        connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
         return redirect(connect_url)
     
     # POST - receber token
     token = request.form.get('token')
     
     if not token:
-        flash('Token não fornecido', 'error')
-        connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+        logger.warning('Autenticação Connect: token não fornecido')
         return redirect(connect_url)
     
     try:
@@ -53,8 +57,7 @@ def connect_auth():
             actions = None
         
         if not user_email:
-            flash('Token inválido: email não encontrado', 'error')
-            connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+            logger.warning('Autenticação Connect: token inválido, email não encontrado')
             return redirect(connect_url)
         
         # Criar objeto User
@@ -66,13 +69,12 @@ def connect_auth():
         )
         
         # Debug: log das ações recebidas (apenas em desenvolvimento)
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"Usuário autenticado: {user_email} - Ações recebidas: {actions} - Has all permissions: {user.has_all_permissions} - Can edit: {user.can_edit()}")
+        if current_app.debug and logger.isEnabledFor(logging.INFO):
+            logger.info(f"Usuário autenticado: {user_email} - Ações recebidas: {actions} - Has all permissions: {user.has_all_permissions} - Can edit: {user.can_edit()}")
         
         # Salvar dados na sessão (salvar None se actions for None para manter consistência)
+        # O email não é repetido aqui: o Flask-Login já o guarda como _user_id
         session['user_data'] = {
-            'email': user_email,
             'name': user_name,
             'profile_name': profile_name,
             'actions': actions  # Pode ser None se não houver ações
@@ -94,12 +96,10 @@ def connect_auth():
         return redirect(url_for('reviews.dashboard'))
         
     except ValueError as e:
-        flash(f'Erro na autenticação: {str(e)}', 'error')
-        connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+        logger.warning('Erro na autenticação via Connect: %s', e)
         return redirect(connect_url)
     except Exception as e:
-        flash(f'Erro interno na autenticação: {str(e)}', 'error')
-        connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+        logger.error('Erro interno na autenticação via Connect: %s', e, exc_info=True)
         return redirect(connect_url)
 
 
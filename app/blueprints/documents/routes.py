@@ -2,9 +2,10 @@
 Rotas para download de documentos
 """
 
-from flask import Blueprint, send_file, abort
+from flask import Blueprint, Response, send_file, abort, current_app
 from flask_login import login_required, current_user
-from app.repositories import review_documents_repository, review_viewers_repository
+from app.repositories import review_documents_repository
+from app.utils.downloads import set_attachment_filename
 import os
 
 bp = Blueprint('documents', __name__)
@@ -14,25 +15,37 @@ bp = Blueprint('documents', __name__)
 @login_required
 def download(doc_id):
     """Download de documento anexo"""
-    doc = review_documents_repository.get_document_by_id(doc_id)
+    # Busca o documento já validando a permissão de visualização (uma única query)
+    doc = review_documents_repository.get_document_if_viewable(doc_id, current_user.email)
     
     if not doc:
         abort(404)
     
-    # Verificar se usuário pode visualizar a revisão
-    review_id = doc['review_id']
-    can_view = review_viewers_repository.can_user_view(review_id, current_user.email)
+    # Atrás do nginx: delegar a entrega do arquivo (sendfile) para a location interna.
+    # O próprio nginx responde 404 se o arquivo não existir.
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        upload_folder = current_app.config.get('UPLOAD_FOLDER')
+        relative_path = os.path.relpath(doc['file_path'], upload_folder).replace(os.sep, '/')
+        response = Response('', headers={
+            'X-Accel-Redirect': f"{accel_prefix.rstrip('/')}/{relative_path}",
+            'Content-Type': 'application/octet-stream'
+        })
+        set_attachment_filename(response, doc['file_name'])
+        return response
     
-    if not can_view:
-        abort(403)
-    
-    # Verificar se arquivo existe
-    if not os.path.exists(doc['file_path']):
+    # send_file já faz o stat do arquivo (tamanho/mtime); arquivo ausente vira 404
+    # sem a checagem prévia com os.path.exists.
+    # Os anexos são gravados com nome único (uuid) e nunca reescritos, então
+    # ETag/Last-Modified do stat permitem responder 304 em downloads repetidos.
+    # Com USE_X_SENDFILE=True o Flask envia apenas o header X-Sendfile (Apache)
+    try:
+        return send_file(
+            doc['file_path'],
+            as_attachment=True,
+            download_name=doc['file_name'],
+            conditional=True,
+            etag=True
+        )
+    except FileNotFoundError:
         abort(404)
-    
-    return send_file(
-        doc['file_path'],
-        as_attachment=True,
-        download_name=doc['file_name']
-    )
-
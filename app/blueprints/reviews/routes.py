@@ -2,20 +2,65 @@
 Rotas de revisões
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, session, current_app
-from flask_login import login_required, current_user
-from app.repositories import reviews_repository, review_viewers_repository, review_approvals_repository, review_documents_repository
+import logging
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, send_file, session, current_app
+from flask_login import login_required, current_user, logout_user
+from app.repositories import reviews_repository, review_viewers_repository, review_approvals_repository, risk_categories_repository
 from app.services.connect_api_service import connect_api_service
 from app.services.email_service import email_service
 from app.services.export_service import export_service
-from app.utils.file_upload import validate_file, save_uploaded_file
+from app.utils.downloads import set_attachment_filename
+from app.utils.file_upload import validate_file, save_uploaded_file, delete_files
 from app.utils.security import require_action
+from app.utils.urls import external_url, get_reviews_base_url
 import os
 from datetime import datetime
-from io import BytesIO
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+from itertools import zip_longest
+from urllib.parse import quote
+from itsdangerous import URLSafeTimedSerializer
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('reviews', __name__)
 
+# Validade dos tokens de aprovação enviados por email (24 horas)
+APPROVAL_TOKEN_MAX_AGE = 86400
+
+# Formatos de exportação suportados e seus mimetypes
+EXPORT_FORMATS = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+# Exportações até este tamanho ficam em memória; acima disso vão para disco
+EXPORT_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+
+@lru_cache(maxsize=4)
+def _serializer_for(secret_key: str) -> URLSafeTimedSerializer:
+    """Serializer dos tokens de aprovação, criado uma única vez por SECRET_KEY"""
+    return URLSafeTimedSerializer(secret_key)
+
+
+def _approval_serializer() -> URLSafeTimedSerializer:
+    """Serializer dos tokens de aprovação da aplicação atual (SECRET_KEY do app.config)"""
+    return _serializer_for(current_app.config['SECRET_KEY'])
+
+
+def _approval_tokens(approver_emails) -> dict:
+    """
+    Gera os tokens de aprovação (email -> token) com um único signer para o lote.
+    Equivalente a _approval_serializer().dumps(email) para cada aprovador.
+    """
+    serializer = _approval_serializer()
+    signer = serializer.make_signer()
+    return {
+        email: signer.sign(serializer.dump_payload(email)).decode('ascii')
+        for email in approver_emails
+    }
+
 
 def get_return_url(review_id, default='detail'):
     """Determina a URL de retorno baseado no parâmetro return_to"""
@@ -26,6 +71,125 @@ def get_return_url(review_id, default='detail'):
         return url_for('reviews.detail', review_id=review_id)
 
 
+def _export_last_modified(review):
+    """
+    Data da alteração mais recente entre os dados exportados de uma revisão
+    (revisão, documento, observações, riscos, aprovações e anexos).
+    Retorna None se nenhuma data estiver disponível.
+    """
+    timestamps = [
+        review.get('updated_at'),
+        review.get('document_updated_at'),
+        review.get('observations_updated_at'),
+    ]
+    timestamps += [risk.get('updated_at') for risk in review.get('risks', [])]
+    timestamps += [a.get('approved_at') or a.get('created_at') for a in review.get('approvals', [])]
+    timestamps += [doc.get('uploaded_at') for doc in review.get('documents', [])]
+    timestamps = [ts for ts in timestamps if isinstance(ts, datetime)]
+    return max(timestamps) if timestamps else None
+
+
+def _send_export(writer, mimetype: str, filename: str, etag: str = None, last_modified=None):
+    """
+    Gera a exportação direto em um arquivo temporário (em memória até
+    EXPORT_SPOOL_MAX_SIZE, depois em disco) e o envia como anexo,
+    sem a cópia extra de bytes -> BytesIO.
+    """
+    buffer = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+    try:
+        writer(buffer)
+        size = buffer.tell()
+        buffer.seek(0)
+        response = send_file(
+            buffer,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=filename,
+            conditional=False,
+            etag=etag or False,
+            last_modified=last_modified
+        )
+        response.content_length = size
+        # O send_file não sabe o tamanho de um arquivo temporário; informando-o,
+        # o Werkzeug também atende If-None-Match e Range (206) nesta resposta
+        response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+    except Exception:
+        buffer.close()
+        raise
+    return response
+
+
+def _form_text(form, name: str, default: str = '') -> str:
+    """Valor de um campo do formulário sem espaços nas pontas (campo ausente/vazio -> default)"""
+    return (form.get(name) or default).strip()
+
+
+def _form_list(form, name: str) -> list:
+    """Valores de um campo múltiplo do formulário, sem espaços nas pontas e sem vazios"""
+    return [value for value in (raw.strip() for raw in form.getlist(name)) if value]
+
+
+def _parse_risks(form) -> list:
+    """
+    Monta a lista de riscos a partir dos campos paralelos do formulário
+    (uma única passagem com zip_longest). Ignora riscos sem texto.
+    """
+    rows = zip_longest(
+        form.getlist('risk_text[]'),
+        form.getlist('legal_suggestion[]'),
+        form.getlist('final_definition[]'),
+        form.getlist('risk_category[]'),
+        fillvalue=''
+    )
+    return [
+        {
+            'risk_text': risk_text,
+            'legal_suggestion': legal_suggestion.strip(),
+            'final_definition': final_definition.strip(),
+            'category_id': category_id or None
+        }
+        for raw_text, legal_suggestion, final_definition, category_id in rows
+        if (risk_text := raw_text.strip())
+    ]
+
+
+def _parse_review_comments(form) -> list:
+    """
+    Monta os comentários de revisão do formulário em nome do usuário atual.
+    Ignora comentários vazios.
+    """
+    reviewer_email = current_user.email
+    reviewer_name = current_user.name
+    review_date = datetime.now()
+    return [
+        {
+            'reviewer_email': reviewer_email,
+            'reviewer_name': reviewer_name,
+            'comments': comment_text,
+            'review_date': review_date
+        }
+        for comment_text in _form_list(form, 'review_comments[]')
+    ]
+
+
+def _viewer_email_args(review_id: int, review) -> dict:
+    """Argumentos dos emails de novo documento (versão 1) ou de nova versão para os visualizadores"""
+    version = review['version']
+    return {
+        'review_data': email_service.review_snapshot(review),
+        'review_url': external_url('reviews.detail', review_id=review_id),
+        'is_new_document': version == 1,
+        'previous_version': version - 1 if version > 1 else None
+    }
+
+
+def _notify_viewers(viewer_emails, review_id: int, review) -> None:
+    """Agenda em segundo plano (uma sessão SMTP para o lote) os emails para os visualizadores"""
+    email_service.send_in_background(
+        email_service.send_emails_to_viewers, viewer_emails, **_viewer_email_args(review_id, review)
+    )
+
+
 @bp.route('/')
 @login_required
 @require_action('view')
@@ -89,9 +253,9 @@ def new():
         try:
             # Validar dados
             document_data = {
-                'title': request.form.get('title', '').strip(),
+                'title': _form_text(request.form, 'title'),
                 'summary': '',  # Campo removido - sempre vazio
-                'description': request.form.get('description', '').strip()
+                'description': _form_text(request.form, 'description')
             }
             
             review_data = {
@@ -99,35 +263,12 @@ def new():
             }
             
             # Processar múltiplas revisões
-            review_comments_list = []
-            comments_texts = request.form.getlist('review_comments[]')
-            for comment_text in comments_texts:
-                if comment_text.strip():
-                    review_comments_list.append({
-                        'reviewer_email': current_user.email,
-                        'reviewer_name': current_user.name,
-                        'comments': comment_text.strip(),
-                        'review_date': datetime.now()
-                    })
+            review_comments_list = _parse_review_comments(request.form)
             
             # Processar riscos
-            risks_data = []
-            risk_texts = request.form.getlist('risk_text[]')
-            legal_suggestions = request.form.getlist('legal_suggestion[]')
-            final_definitions = request.form.getlist('final_definition[]')
-            risk_categories = request.form.getlist('risk_category[]')
-            
-            for i in range(len(risk_texts)):
-                if risk_texts[i].strip():
-                    category_id = risk_categories[i] if i < len(risk_categories) and risk_categories[i] else None
-                    risks_data.append({
-                        'risk_text': risk_texts[i].strip(),
-                        'legal_suggestion': legal_suggestions[i].strip() if i < len(legal_suggestions) else '',
-                        'final_definition': final_definitions[i].strip() if i < len(final_definitions) else '',
-                        'category_id': category_id
-                    })
+            risks_data = _parse_risks(request.form)
             
-            observations = request.form.get('observations', '').strip()
+            observations = _form_text(request.form, 'observations')
             
             # Criar revisão
             review_id = reviews_repository.create_review(
@@ -152,19 +293,14 @@ def new():
             
             # Redirecionar para seleção de visualizadores (fluxo original)
             flash('Revisão criada com sucesso!', 'success')
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f'Revisão {review_id} criada com sucesso. Redirecionando para select_viewers.')
+            logger.info('Revisão %s criada com sucesso. Redirecionando para select_viewers.', review_id)
             return redirect(url_for('reviews.select_viewers', review_id=review_id))
             
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f'Erro ao criar revisão: {str(e)}', exc_info=True)
+            logger.error('Erro ao criar revisão: %s', e, exc_info=True)
             flash(f'Erro ao criar revisão: {str(e)}', 'error')
     
     # Buscar categorias de risco para o formulário
-    from app.repositories import risk_categories_repository
     risk_categories = risk_categories_repository.list_all_categories()
     
     return render_template('reviews/form.html', review=None, risk_categories=risk_categories)
@@ -175,69 +311,40 @@ def new():
 @require_action('edit')
 def edit(review_id):
     """Edita revisão (cria nova versão)"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
-    
-    if not review:
-        flash('Revisão não encontrada ou sem permissão', 'error')
-        return redirect(url_for('reviews.manage'))
-    
     if request.method == 'POST':
+        # Permissão verificada antes de gravar; no GET a própria get_review_full verifica
+        if not reviews_repository.get_review_by_id(review_id, current_user.email):
+            flash('Revisão não encontrada ou sem permissão', 'error')
+            return redirect(url_for('reviews.manage'))
+        
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
             document_data = {
-                'title': request.form.get('title', '').strip(),
+                'title': _form_text(request.form, 'title'),
                 'summary': '',  # Campo removido - sempre vazio
-                'description': request.form.get('description', '').strip()
+                'description': _form_text(request.form, 'description')
             }
             
             review_data = {
                 'comments': ''  # Não usado mais - usar review_comments
             }
             
-            # Processar múltiplas revisões - pegar comentários da versão anterior para comparar
-            old_review_comments = reviews_repository.get_review_comments(review_id)
-            old_comments_texts = {c.get('comments', '').strip() for c in old_review_comments}
-            
-            # Processar apenas comentários NOVOS (que não existiam na versão anterior)
-            review_comments_list = []
-            comments_texts = request.form.getlist('review_comments[]')
-            for comment_text in comments_texts:
-                comment_text_stripped = comment_text.strip()
-                if comment_text_stripped and comment_text_stripped not in old_comments_texts:
-                    # Este é um comentário novo, adicionar à lista
-                    review_comments_list.append({
-                        'reviewer_email': current_user.email,
-                        'reviewer_name': current_user.name,
-                        'comments': comment_text_stripped,
-                        'review_date': datetime.now()
-                    })
-            
-            # Processar riscos - pegar riscos da versão anterior para comparar
-            old_risks = reviews_repository.get_review_risks(review_id)
-            old_risk_texts = {r.get('risk_text', '').strip() for r in old_risks}
+            review_comments_list = _parse_review_comments(request.form)
+            risks_data = _parse_risks(request.form)
             
-            # Processar apenas riscos NOVOS (que não existiam na versão anterior)
-            risks_data = []
-            risk_texts = request.form.getlist('risk_text[]')
-            legal_suggestions = request.form.getlist('legal_suggestion[]')
-            final_definitions = request.form.getlist('final_definition[]')
-            risk_categories_form = request.form.getlist('risk_category[]')
+            # Comentários e riscos enviados que já existiam na versão anterior (uma única consulta)
+            old_comments_texts, old_risk_texts = reviews_repository.get_existing_texts(
+                review_id,
+                [c['comments'] for c in review_comments_list],
+                [r['risk_text'] for r in risks_data]
+            )
             
-            for i in range(len(risk_texts)):
-                risk_text_stripped = risk_texts[i].strip()
-                if risk_text_stripped and risk_text_stripped not in old_risk_texts:
-                    # Este é um risco novo, adicionar à lista
-                    category_id = risk_categories_form[i] if i < len(risk_categories_form) and risk_categories_form[i] else None
-                    risks_data.append({
-                        'risk_text': risk_text_stripped,
-                        'legal_suggestion': legal_suggestions[i].strip() if i < len(legal_suggestions) else '',
-                        'final_definition': final_definitions[i].strip() if i < len(final_definitions) else '',
-                        'category_id': category_id
-                    })
+            # Manter apenas comentários e riscos NOVOS (que não existiam na versão anterior)
+            if old_comments_texts:
+                review_comments_list = [c for c in review_comments_list if c['comments'] not in old_comments_texts]
+            if old_risk_texts:
+                risks_data = [r for r in risks_data if r['risk_text'] not in old_risk_texts]
             
-            observations = request.form.get('observations', '').strip()
+            observations = _form_text(request.form, 'observations')
             
             # Determinar se há novos comentários ou riscos
             has_new_comments = len(review_comments_list) > 0
@@ -259,96 +366,47 @@ def edit(review_id):
             if has_new_comments and review_comments_list:
                 reviews_repository.add_review_comments(new_review_id, review_comments_list)
             
-            # Buscar viewers para envio de email
-            viewers = review_viewers_repository.get_viewers(new_review_id)
-            viewer_emails = [v['user_email'] for v in viewers]
-            
-            # Buscar dados da nova versão criada (DEPOIS de adicionar viewers)
-            new_review = reviews_repository.get_review_by_id(new_review_id, current_user.email)
+            # Buscar dados da nova versão criada junto com os viewers (para envio de email)
+            new_review = reviews_repository.get_review_with_viewer_emails(new_review_id, current_user.email)
             
             if not new_review:
                 flash('Erro ao buscar nova versão criada', 'error')
                 return redirect(url_for('reviews.manage'))
             
-            # has_new_risks já foi determinado na linha 211
-            logger.info(f"Detecção de novos riscos: {has_new_risks}")
+            viewer_emails = new_review['viewer_emails']
+            
+            logger.info("Detecção de novos riscos: %s", has_new_risks)
             
             # Fluxo baseado em detecção de novos riscos
             if has_new_risks:
                 # Redirecionar para escolha de aprovação
                 flash('Revisão atualizada com sucesso! Novos riscos detectados.', 'success')
-                logger.info(f"Redirecionando para choose_approval (novos riscos detectados)")
+                logger.info("Redirecionando para choose_approval (novos riscos detectados)")
                 return redirect(url_for('reviews.choose_approval', review_id=new_review_id))
             else:
                 # Sem novos riscos: enviar e-mail para visualizadores e redirecionar
                 try:
                     if viewer_emails:
-                        # Construir URL de visualização
-                        reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-                        if not reviews_base_url:
-                            server_name = current_app.config.get('SERVER_NAME')
-                            preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-                            if server_name:
-                                reviews_base_url = f"{preferred_scheme}://{server_name}"
-                            else:
-                                host_url = request.host_url.rstrip('/')
-                                if ':5001' in host_url:
-                                    reviews_base_url = host_url.replace(':5001', ':5002')
-                                else:
-                                    reviews_base_url = host_url
-                        else:
-                            reviews_base_url = reviews_base_url.rstrip('/')
-                        
-                        review_url = f"{reviews_base_url}{url_for('reviews.detail', review_id=new_review_id)}"
-                        
-                        # Enviar e-mails para visualizadores (nova versão)
-                        previous_version = new_review['version'] - 1
-                        result = email_service.send_emails_to_viewers(
-                            viewer_emails, new_review, review_url,
-                            is_new_document=False,
-                            previous_version=previous_version
-                        )
-                        
-                        logger.info(f"E-mails enviados para {len(result['sent'])} visualizador(es)")
-                        if result['failed']:
-                            logger.warning(f"Falha ao enviar para {len(result['failed'])} visualizador(es)")
+                        # Enviar e-mails para visualizadores (nova versão) em segundo plano
+                        _notify_viewers(viewer_emails, new_review_id, new_review)
                 except Exception as e:
-                    logger.error(f"Erro ao enviar e-mails para visualizadores: {str(e)}", exc_info=True)
+                    logger.error("Erro ao enviar e-mails para visualizadores: %s", e, exc_info=True)
                 
                 flash('Revisão atualizada com sucesso!', 'success')
                 return redirect(url_for('reviews.detail', review_id=new_review_id))
             
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f'Erro ao atualizar revisão: {str(e)}', exc_info=True)
+            logger.error('Erro ao atualizar revisão: %s', e, exc_info=True)
             flash(f'Erro ao atualizar revisão: {str(e)}', 'error')
     
-    # Carregar dados para edição
-    risks = reviews_repository.get_review_risks(review_id)
-    observations_obj = reviews_repository.get_review_observations(review_id)
-    review_comments = reviews_repository.get_review_comments(review_id)
-    
-    # Carregar históricos completos (todas as versões)
-    all_versions = reviews_repository.get_all_document_versions(
-        review['document_id'], current_user.email
-    )
-    versions_with_comments = reviews_repository.get_all_versions_with_comments(
-        review['document_id'], current_user.email
-    )
-    versions_with_risks = reviews_repository.get_all_versions_with_risks(
-        review['document_id'], current_user.email
-    )
+    # Dados para edição e históricos completos (todas as versões) em uma única consulta
+    review = reviews_repository.get_review_full(review_id, current_user.email, include_history=True)
     
-    review['risks'] = risks
-    review['observations'] = observations_obj.get('observations', '') if observations_obj else ''
-    review['review_comments'] = review_comments
-    review['all_versions'] = all_versions
-    review['versions_with_comments'] = versions_with_comments
-    review['versions_with_risks'] = versions_with_risks
+    if not review:
+        flash('Revisão não encontrada ou sem permissão', 'error')
+        return redirect(url_for('reviews.manage'))
     
     # Buscar categorias de risco para o formulário
-    from app.repositories import risk_categories_repository
     risk_categories = risk_categories_repository.list_all_categories()
     
     return render_template('reviews/form.html', review=review, risk_categories=risk_categories)
@@ -359,36 +417,14 @@ def edit(review_id):
 @require_action('view')
 def detail(review_id):
     """Detalhes da revisão"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
+    # Revisão + riscos, observações, aprovações, documentos, versões e históricos
+    # de comentários/riscos em uma consulta
+    review = reviews_repository.get_review_full(review_id, current_user.email, include_history=True)
     
     if not review:
         flash('Revisão não encontrada ou sem permissão', 'error')
         return redirect(url_for('reviews.manage'))
     
-    # Carregar dados relacionados
-    risks = reviews_repository.get_review_risks(review_id)
-    observations = reviews_repository.get_review_observations(review_id)
-    approvals = review_approvals_repository.get_review_approvals(review_id)
-    
-    # Carregar históricos completos
-    all_versions = reviews_repository.get_all_document_versions(
-        review['document_id'], current_user.email
-    )
-    versions_with_comments = reviews_repository.get_all_versions_with_comments(
-        review['document_id'], current_user.email
-    )
-    versions_with_risks = reviews_repository.get_all_versions_with_risks(
-        review['document_id'], current_user.email
-    )
-    
-    review['risks'] = risks
-    review['observations'] = observations.get('observations', '') if observations else ''
-    review['approvals'] = approvals
-    review['documents'] = review_documents_repository.get_review_documents(review_id)
-    review['all_versions'] = all_versions
-    review['versions_with_comments'] = versions_with_comments
-    review['versions_with_risks'] = versions_with_risks
-    
     return render_template('reviews/detail.html', review=review)
 
 
@@ -397,37 +433,22 @@ def detail(review_id):
 @require_action('delete')
 def delete(review_id):
     """Exclui TODAS as revisões do documento (hard delete)"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
-    
-    if not review:
-        flash('Revisão não encontrada ou sem permissão', 'error')
-        return_to = request.args.get('return_to') or request.form.get('return_to', '')
-        if return_to == 'manage':
-            return redirect(url_for('reviews.manage'))
-        else:
-            return redirect(url_for('reviews.dashboard'))
-    
     try:
-        document_id = review['document_id']
-        
-        # Obter TODAS as revisões do documento para excluir arquivos
-        all_reviews = reviews_repository.get_review_versions(document_id, current_user.email)
+        # Permissão, caminhos dos anexos e exclusão do documento (as versões e seus
+        # registros saem via ON DELETE CASCADE) em um único comando
+        deleted = reviews_repository.delete_review_if_permitted(review_id, current_user.email)
         
-        # Excluir arquivos de TODAS as revisões do documento
-        for rev in all_reviews:
-            documents = review_documents_repository.get_review_documents(rev['id'])
-            for doc in documents:
-                review_documents_repository.delete_document_file(doc['id'])
-        
-        # Excluir TODAS as revisões do documento e o documento
-        # (a função delete_review agora exclui todas as versões)
-        reviews_repository.delete_review(review_id)
-        
-        flash('Documento e todas as suas revisões excluídos com sucesso!', 'success')
+        if deleted is None:
+            flash('Revisão não encontrada ou sem permissão', 'error')
+        else:
+            # Excluir os arquivos do servidor em paralelo, só depois do banco
+            delete_files(deleted['file_paths'])
+            export_service.invalidate_exports(
+                current_app.config.get('EXPORT_CACHE_DIR'), deleted['review_ids']
+            )
+            flash('Documento e todas as suas revisões excluídos com sucesso!', 'success')
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'Erro ao excluir documento: {str(e)}', exc_info=True)
+        logger.error('Erro ao excluir documento: %s', e, exc_info=True)
         flash(f'Erro ao excluir documento: {str(e)}', 'error')
     
     # Redirecionar baseado no contexto de onde veio
@@ -452,9 +473,8 @@ def pending_approvals():
 @require_action('edit')
 def submit_approval(review_id):
     """Submete revisão à aprovação sem criar nova versão"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
-    
-    if not review:
+    # Só a permissão importa aqui (SELECT 1); request_approval carrega a revisão em seguida
+    if not review_viewers_repository.can_user_view(review_id, current_user.email):
         flash('Revisão não encontrada ou sem permissão', 'error')
         return redirect(url_for('reviews.manage'))
     
@@ -471,52 +491,33 @@ def submit_approval(review_id):
 @require_action('edit')
 def manage_viewers(review_id):
     """Gerencia visualizadores de uma revisão sem editar"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
+    # Os viewers atuais vêm na mesma consulta da revisão
+    review = reviews_repository.get_review_with_viewer_emails(review_id, current_user.email)
     
     if not review:
         flash('Revisão não encontrada ou sem permissão', 'error')
         return redirect(url_for('reviews.manage'))
     
     if request.method == 'POST':
-        viewer_emails = request.form.getlist('viewers[]')
-        
-        # Sempre incluir o criador da revisão como viewer
-        if current_user.email not in viewer_emails:
-            viewer_emails.append(current_user.email)
-        
-        if viewer_emails:
-            # Obter visualizadores atuais antes de atualizar
-            current_viewers = review_viewers_repository.get_viewers(review_id)
-            current_viewer_emails = {v['user_email'] for v in current_viewers}
-            new_viewer_emails = set(viewer_emails)
-            
-            # Remover visualizadores que não estão mais na lista
-            viewers_to_remove = current_viewer_emails - new_viewer_emails
-            for email in viewers_to_remove:
-                review_viewers_repository.remove_viewer(review_id, email)
+        # Sem viewers[] a lista de usuários não chegou a carregar na página: gravar
+        # apenas o usuário atual removeria todos os outros visualizadores
+        if 'viewers[]' not in request.form:
+            flash('A lista de usuários não foi carregada. Recarregue a página e tente novamente.', 'error')
+        else:
+            # Sempre incluir o criador da revisão como viewer (duplicados são removidos no repositório)
+            viewer_emails = _form_list(request.form, 'viewers[]') + [current_user.email]
             
-            # Adicionar/atualizar visualizadores selecionados
-            review_viewers_repository.add_viewers(review_id, viewer_emails)
+            # Remover quem saiu da lista e adicionar/atualizar os selecionados em uma transação
+            review_viewers_repository.set_viewers(review_id, viewer_emails)
             flash('Visualizadores atualizados com sucesso!', 'success')
             return redirect(get_return_url(review_id))
-        else:
-            flash('Selecione pelo menos um visualizador', 'error')
-    
-    # Obter lista de usuários do Connect
-    try:
-        users = connect_api_service.get_users(request_context=request)
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'Erro ao obter lista de usuários: {str(e)}', exc_info=True)
-        users = []
-        flash('Erro ao carregar lista de usuários. Tente novamente.', 'error')
     
-    current_viewers = review_viewers_repository.get_viewers(review_id)
-    viewer_emails = [v['user_email'] for v in current_viewers]
+    # A lista de usuários do Connect é carregada pela página via users_json,
+    # sem bloquear a renderização na API externa
+    viewer_emails = review['viewer_emails']
     return_to = request.args.get('return_to', '')
     
-    return render_template('reviews/manage_viewers.html', review=review, users=users, viewer_emails=viewer_emails, return_to=return_to)
+    return render_template('reviews/manage_viewers.html', review=review, viewer_emails=viewer_emails, return_to=return_to)
 
 
 @bp.route('/<int:review_id>/select-viewers', methods=['GET', 'POST'])
@@ -524,51 +525,52 @@ def manage_viewers(review_id):
 @require_action('edit')
 def select_viewers(review_id):
     """Seleciona visualizadores da revisão"""
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f'Acessando select_viewers para revisão {review_id} - usuário: {current_user.email}')
+    logger.info('Acessando select_viewers para revisão %s - usuário: %s', review_id, current_user.email)
     
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
+    # Os viewers atuais vêm na mesma consulta da revisão
+    review = reviews_repository.get_review_with_viewer_emails(review_id, current_user.email)
     
     if not review:
-        logger.warning(f'Revisão {review_id} não encontrada para usuário {current_user.email}')
+        logger.warning('Revisão %s não encontrada para usuário %s', review_id, current_user.email)
         flash('Revisão não encontrada', 'error')
         return redirect(url_for('reviews.manage'))
     
     if request.method == 'POST':
-        viewer_emails = request.form.getlist('viewers[]')
+        # Sempre incluir o criador da revisão como viewer (duplicados são removidos no repositório).
+        # add_viewers só acrescenta: sem a lista do Connect (viewers[] ausente) segue só com o usuário atual
+        viewer_emails = _form_list(request.form, 'viewers[]') + [current_user.email]
         
-        # Sempre incluir o criador da revisão como viewer
-        if current_user.email not in viewer_emails:
-            viewer_emails.append(current_user.email)
+        review_viewers_repository.add_viewers(review_id, viewer_emails)
+        flash('Visualizadores definidos com sucesso!', 'success')
         
-        if viewer_emails:
-            review_viewers_repository.add_viewers(review_id, viewer_emails)
-            flash('Visualizadores definidos com sucesso!', 'success')
-            
-            # Redirecionar para tela de escolha (enviar para aprovação ou não)
-            return redirect(url_for('reviews.choose_approval', review_id=review_id))
-        else:
-            flash('Selecione pelo menos um visualizador', 'error')
+        # Redirecionar para tela de escolha (enviar para aprovação ou não)
+        return redirect(url_for('reviews.choose_approval', review_id=review_id))
+    
+    # A lista de usuários do Connect é carregada pela página via users_json,
+    # sem bloquear a renderização na API externa
+    viewer_emails = review['viewer_emails']
+    logger.info('Visualizadores atuais: %s', viewer_emails)
     
-    # Obter lista de usuários do Connect
+    return render_template('reviews/select_viewers.html', review=review, viewer_emails=viewer_emails)
+
+
+@bp.route('/users.json')
+@login_required
+def users_json():
+    """Lista de usuários do Connect (nome/email) para os seletores carregados via fetch"""
     try:
-        # Passar contexto da requisição para incluir cookies de sessão
-        users = connect_api_service.get_users(request_context=request)
-        logger.info(f'Lista de usuários obtida: {len(users)} usuários')
-        if len(users) == 0:
-            logger.warning('Lista de usuários vazia - verifique se o Connect está acessível e autenticado')
-            flash('Nenhum usuário encontrado. Verifique a conexão com o Connect.', 'warning')
+        # Passar contexto da requisição para incluir cookies de sessão; ?refresh=1 ignora o cache
+        users = connect_api_service.get_users(
+            request_context=request, refresh=request.args.get('refresh') == '1'
+        )
     except Exception as e:
-        logger.error(f'Erro ao obter lista de usuários: {str(e)}', exc_info=True)
-        users = []
-        flash('Erro ao carregar lista de usuários. Tente novamente.', 'error')
+        logger.error('Erro ao obter lista de usuários: %s', e, exc_info=True)
+        return jsonify({'error': 'Erro ao carregar lista de usuários'}), 502
     
-    current_viewers = review_viewers_repository.get_viewers(review_id)
-    viewer_emails = [v['user_email'] for v in current_viewers]
-    logger.info(f'Visualizadores atuais: {viewer_emails}')
+    if not users:
+        logger.warning('Lista de usuários vazia - verifique se o Connect está acessível e autenticado')
     
-    return render_template('reviews/select_viewers.html', review=review, users=users, viewer_emails=viewer_emails)
+    return jsonify([{'name': u.get('name') or u.get('email'), 'email': u.get('email')} for u in users if u.get('email')])
 
 
 @bp.route('/<int:review_id>/choose-approval', methods=['GET', 'POST'])
@@ -576,14 +578,13 @@ def select_viewers(review_id):
 @require_action('edit')
 def choose_approval(review_id):
     """Tela intermediária para escolher se deseja enviar para aprovação"""
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f'Acessando choose_approval para revisão {review_id} - usuário: {current_user.email}')
+    logger.info('Acessando choose_approval para revisão %s - usuário: %s', review_id, current_user.email)
     
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
+    # Os emails dos viewers vêm na mesma consulta (usados ao optar por não enviar para aprovação)
+    review = reviews_repository.get_review_with_viewer_emails(review_id, current_user.email)
     
     if not review:
-        logger.warning(f'Revisão {review_id} não encontrada para usuário {current_user.email}')
+        logger.warning('Revisão %s não encontrada para usuário %s', review_id, current_user.email)
         flash('Revisão não encontrada', 'error')
         return redirect(url_for('reviews.manage'))
     
@@ -601,44 +602,12 @@ def choose_approval(review_id):
             # Usuário escolheu não enviar para aprovação agora
             # Enviar e-mail para visualizadores
             try:
-                viewers = review_viewers_repository.get_viewers(review_id)
-                viewer_emails = [v['user_email'] for v in viewers]
+                viewer_emails = review['viewer_emails']
                 
                 if viewer_emails:
-                    # Construir URL de visualização
-                    reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-                    if not reviews_base_url:
-                        server_name = current_app.config.get('SERVER_NAME')
-                        preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-                        if server_name:
-                            reviews_base_url = f"{preferred_scheme}://{server_name}"
-                        else:
-                            host_url = request.host_url.rstrip('/')
-                            if ':5001' in host_url:
-                                reviews_base_url = host_url.replace(':5001', ':5002')
-                            else:
-                                reviews_base_url = host_url
-                    else:
-                        reviews_base_url = reviews_base_url.rstrip('/')
-                    
-                    review_url = f"{reviews_base_url}{url_for('reviews.detail', review_id=review_id)}"
-                    
-                    # Determinar se é novo documento ou nova versão
-                    is_new_document = (review['version'] == 1)
-                    previous_version = review['version'] - 1 if review['version'] > 1 else None
-                    
-                    # Enviar e-mails
-                    result = email_service.send_emails_to_viewers(
-                        viewer_emails, review, review_url,
-                        is_new_document=is_new_document,
-                        previous_version=previous_version
-                    )
-                    
-                    logger.info(f"E-mails enviados para {len(result['sent'])} visualizador(es)")
-                    if result['failed']:
-                        logger.warning(f"Falha ao enviar para {len(result['failed'])} visualizador(es)")
+                    _notify_viewers(viewer_emails, review_id, review)
             except Exception as e:
-                logger.error(f"Erro ao enviar e-mails para visualizadores: {str(e)}", exc_info=True)
+                logger.error("Erro ao enviar e-mails para visualizadores: %s", e, exc_info=True)
             
             flash('Revisão criada com sucesso! Você pode solicitar aprovação mais tarde.', 'success')
             return redirect(get_return_url(review_id))
@@ -647,225 +616,154 @@ def choose_approval(review_id):
     return render_template('reviews/choose_approval.html', review=review, return_to=return_to)
 
 
+def _render_request_approval(review, users=None):
+    """
+    Renderiza a tela de solicitação de aprovação. Sem users, busca a lista do Connect
+    (memoizada por request e em cache entre requests).
+    """
+    if users is None:
+        try:
+            # Passar contexto da requisição para incluir cookies de sessão
+            users = connect_api_service.get_users(request_context=request)
+            logger.info('Lista de usuários obtida para aprovação: %s usuários', len(users))
+            if len(users) == 0:
+                logger.warning('Lista de usuários vazia para aprovação - verifique se o Connect está acessível e autenticado')
+                flash('Nenhum usuário encontrado. Verifique a conexão com o Connect.', 'warning')
+        except Exception as e:
+            logger.error('Erro ao obter lista de usuários: %s', e, exc_info=True)
+            users = []
+            flash('Erro ao carregar lista de usuários. Tente novamente.', 'error')
+    
+    return_to = request.args.get('return_to', '')
+    return render_template('reviews/request_approval.html', review=review, users=users, return_to=return_to)
+
+
 @bp.route('/<int:review_id>/request-approval', methods=['GET', 'POST'])
 @login_required
 @require_action('edit')
 def request_approval(review_id):
     """Solicita aprovação da revisão"""
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f'Acessando request_approval para revisão {review_id} - usuário: {current_user.email}')
+    logger.info('Acessando request_approval para revisão %s - usuário: %s', review_id, current_user.email)
     
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
+    # Emails dos visualizadores vêm junto com a revisão (usados nos avisos do POST)
+    review = reviews_repository.get_review_with_viewer_emails(review_id, current_user.email)
     
     if not review:
-        logger.warning(f'Revisão {review_id} não encontrada para usuário {current_user.email}')
+        logger.warning('Revisão %s não encontrada para usuário %s', review_id, current_user.email)
         flash('Revisão não encontrada', 'error')
         return redirect(url_for('reviews.manage'))
     
-    if request.method == 'POST':
-        approver_emails = request.form.getlist('approvers[]')
+    if request.method != 'POST':
+        return _render_request_approval(review)
+    
+    # Buscar usuários uma vez, indexados por email em minúsculas
+    users_by_email = connect_api_service.get_users_by_email(request_context=request)
+    
+    # Remover duplicados e emails desconhecidos antes de gravar aprovações ou enviar emails
+    approver_emails = []
+    seen_emails = set()
+    for email in _form_list(request.form, 'approvers[]'):
+        email_key = email.lower()
+        if email_key in seen_emails:
+            continue
+        seen_emails.add(email_key)
         
-        if approver_emails:
-            try:
-                # Criar solicitação de aprovação
-                review_approvals_repository.create_approval_request(
-                    review_id, current_user.email, approver_emails
-                )
-                logger.info(f'Solicitação de aprovação criada para revisão {review_id} com {len(approver_emails)} aprovador(es)')
-                
-                # Enviar emails
-                from flask import url_for, current_app
-                
-                # Obter URL base do sistema de revisões jurídicas (não do Connect)
-                # Prioridade: variável de ambiente REVIEWS_BASE_URL > SERVER_NAME configurado > request.host_url
-                reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-                if not reviews_base_url:
-                    # Tentar usar SERVER_NAME da configuração do sistema de revisões
-                    server_name = current_app.config.get('SERVER_NAME')
-                    preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-                    if server_name:
-                        reviews_base_url = f"{preferred_scheme}://{server_name}"
-                    else:
-                        # Fallback: usar host_url da requisição atual (sistema de revisões)
-                        # Garantir que não está usando URL do Connect
-                        host_url = request.host_url.rstrip('/')
-                        # Se host_url contém porta do Connect (5001), usar porta padrão de revisões (5002)
-                        if ':5001' in host_url:
-                            reviews_base_url = host_url.replace(':5001', ':5002')
-                        else:
-                            reviews_base_url = host_url
-                else:
-                    reviews_base_url = reviews_base_url.rstrip('/')
-                
-                logger.info(f'URL base do sistema de revisões para links de aprovação: {reviews_base_url}')
-                
-                # Buscar lista de usuários uma vez
-                users = connect_api_service.get_users(request_context=request)
-                emails_sent = []
-                emails_failed = []
+        # Sem a lista do Connect (indisponível) não há como validar; mantém o email informado
+        if not users_by_email:
+            approver_emails.append(email)
+        elif email_key in users_by_email:
+            approver_emails.append(users_by_email[email_key]['email'])
+        else:
+            logger.warning('Aprovador ignorado (não encontrado no Connect): %s', email)
+    
+    if approver_emails:
+        try:
+            # Nomes dos aprovadores resolvidos uma vez (usados no banco e nos emails)
+            name_by_email = {
+                approver_email: connect_api_service.user_name_from(users_by_email, approver_email)
+                for approver_email in approver_emails
+            }
+            
+            # Criar solicitação de aprovação
+            review_approvals_repository.create_approval_request(
+                review_id, current_user.email, approver_emails, name_by_email
+            )
+            logger.info('Solicitação de aprovação criada para revisão %s com %s aprovador(es)', review_id, len(approver_emails))
+            
+            # Enviar emails
+            
+            # Obter URL base do sistema de revisões jurídicas (não do Connect)
+            reviews_base_url = get_reviews_base_url()
+            
+            logger.info('URL base do sistema de revisões para links de aprovação: %s', reviews_base_url)
+            
+            # Gerar tokens e URLs de aprovação (rápido, no próprio request)
+            # Só o email é assinado; o review_id já está na URL
+            tokens = _approval_tokens(approver_emails)
+            approvers = []
+            for approver_email in approver_emails:
+                approver_name = name_by_email[approver_email]
                 
-                for approver_email in approver_emails:
-                    try:
-                        # Buscar nome do aprovador do Connect
-                        approver_name = next((u.get('name', approver_email) for u in users if u.get('email') == approver_email), approver_email)
-                        
-                        # Gerar token de aprovação
-                        from itsdangerous import URLSafeTimedSerializer
-                        serializer = URLSafeTimedSerializer(os.getenv('SECRET_KEY'))
-                        token = serializer.dumps({'review_id': review_id, 'approver_email': approver_email})
-                        
-                        # Construir URL de aprovação (token será removido da URL após primeira chamada)
-                        approve_path = url_for('reviews.approve', review_id=review_id, token=token)
-                        approval_url = f"{reviews_base_url}{approve_path}"
-                        
-                        # Enviar email para o aprovador
-                        email_sent = email_service.send_approval_request_email(
-                            approver_email, approver_name, review, approval_url
-                        )
-                        
-                        if email_sent:
-                            emails_sent.append(approver_email)
-                            logger.info(f'Email de solicitação enviado para aprovador: {approver_email}')
-                        else:
-                            emails_failed.append(approver_email)
-                            logger.warning(f'Falha ao enviar email para aprovador: {approver_email}')
-                    except Exception as e:
-                        emails_failed.append(approver_email)
-                        logger.error(f'Erro ao enviar email para aprovador {approver_email}: {str(e)}', exc_info=True)
+                # Construir URL de aprovação (token será removido da URL após primeira chamada)
+                approve_path = url_for('reviews.approve', review_id=review_id, token=tokens[approver_email])
+                approvers.append((approver_email, approver_name, f"{reviews_base_url}{approve_path}"))
+            
+            # Emails dos aprovadores, da confirmação e dos visualizadores vão juntos em um
+            # único envio em segundo plano (uma sessão SMTP; a resposta não espera pelo SMTP)
+            messages = email_service.approval_request_messages(approvers, email_service.review_snapshot(review))
+            
+            # Enviar email de confirmação para o solicitante
+            try:
+                reviewer_name = current_user.name or current_user.email
+                reviewer_email = current_user.email
                 
-                # Enviar email de confirmação para o solicitante
-                try:
-                    reviewer_name = current_user.name or current_user.email
-                    reviewer_email = current_user.email
-                    
-                    # Buscar nomes dos aprovadores para o email
-                    approver_names_list = []
-                    for approver_email in approver_emails:
-                        approver_name = next((u.get('name', approver_email) for u in users if u.get('email') == approver_email), approver_email)
-                        approver_names_list.append(approver_name)
-                    
-                    approvers_text = ', '.join(approver_names_list) if approver_names_list else 'os aprovadores selecionados'
-                    
-                    # Criar template de confirmação de submissão
-                    confirmation_subject = f"Revisão Jurídica Submetida para Aprovação - {review.get('title', 'Documento')}"
-                    confirmation_html = f"""
-                    <!DOCTYPE html>
-                    <html>
-                    <head>
-                        <meta charset="UTF-8">
-                        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                        <title>Revisão Submetida para Aprovação</title>
-                    </head>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; background-color: #f0f0f0;">
-                        <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="background-color: #f0f0f0; padding: 20px;">
-                            <tr>
-                                <td align="center">
-                                    <table role="presentation" width="600" cellpadding="0" cellspacing="0" style="max-width: 600px; background-color: #ffffff; border-radius: 15px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                                        <tr>
-                                            <td style="background: linear-gradient(135deg, #8B5CF6 0%, #7C3AED 100%); color: #ffffff; padding: 30px; text-align: center;">
-                                                <h1 style="margin: 0; font-size: 28px; font-weight: bold;">Revisão Submetida</h1>
-                                                <p style="margin: 10px 0 0 0; font-size: 16px;">Sistema de Revisões Jurídicas</p>
-                                            </td>
-                                        </tr>
-                                        <tr>
-                                            <td style="padding: 40px;">
-                                                <h2 style="margin: 0 0 15px 0; font-size: 24px; color: #333;">Olá, {reviewer_name}!</h2>
-                                                <p style="margin: 0 0 25px 0; font-size: 16px; color: #333;">
-                                                    Sua revisão jurídica foi submetida para aprovação com sucesso.
-                                                </p>
-                                                
-                                                <div style="background-color: #f8f9fa; border-left: 4px solid #8B5CF6; padding: 20px; margin: 20px 0; border-radius: 4px;">
-                                                    <h3 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">Informações da Revisão</h3>
-                                                    <p style="margin: 5px 0;"><strong>Título:</strong> {review.get('title', 'N/A')}</p>
-                                                    <p style="margin: 5px 0;"><strong>Versão:</strong> v{review.get('version', 'N/A')}</p>
-                                                    <p style="margin: 5px 0;"><strong>Aprovador(es):</strong> {approvers_text}</p>
-                                                    <p style="margin: 5px 0;"><strong>Data/Hora:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                                                </div>
-                                                
-                                                <p style="margin: 20px 0 0 0; font-size: 14px; color: #666;">
-                                                    Você será notificado quando a revisão for aprovada ou rejeitada.
-                                                </p>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                </td>
-                            </tr>
-                        </table>
-                    </body>
-                    </html>
-                    """
-                    
-                    email_service._send_email(reviewer_email, confirmation_subject, confirmation_html)
-                    logger.info(f'Email de confirmação enviado para solicitante: {reviewer_email}')
-                except Exception as e:
-                    logger.error(f'Erro ao enviar email de confirmação para solicitante: {str(e)}', exc_info=True)
+                # Nomes dos aprovadores já resolvidos acima
+                approver_names_list = [approver_name for _, approver_name, _ in approvers]
                 
-                # Enviar e-mails para visualizadores informando nova versão/documento
-                try:
-                    viewers = review_viewers_repository.get_viewers(review_id)
-                    viewer_emails = [v['user_email'] for v in viewers]
-                    
-                    if viewer_emails:
-                        review_url = f"{reviews_base_url}{url_for('reviews.detail', review_id=review_id)}"
-                        
-                        # Determinar se é novo documento ou nova versão
-                        is_new_document = (review['version'] == 1)
-                        previous_version = review['version'] - 1 if review['version'] > 1 else None
-                        
-                        # Enviar e-mails
-                        viewer_result = email_service.send_emails_to_viewers(
-                            viewer_emails, review, review_url,
-                            is_new_document=is_new_document,
-                            previous_version=previous_version
-                        )
-                        
-                        logger.info(f"E-mails enviados para {len(viewer_result['sent'])} visualizador(es)")
-                        if viewer_result['failed']:
-                            logger.warning(f"Falha ao enviar para {len(viewer_result['failed'])} visualizador(es)")
-                except Exception as e:
-                    logger.error(f"Erro ao enviar e-mails para visualizadores: {str(e)}", exc_info=True)
+                approvers_text = ', '.join(approver_names_list) if approver_names_list else 'os aprovadores selecionados'
                 
-                # Mensagem de sucesso com informações sobre os emails
-                if emails_sent:
-                    if emails_failed:
-                        flash(f'Solicitação de aprovação criada! Emails enviados para {len(emails_sent)} aprovador(es), mas falhou para {len(emails_failed)}.', 'warning')
-                    else:
-                        flash('Solicitação de aprovação enviada com sucesso! Emails enviados para todos os aprovadores.', 'success')
-                else:
-                    flash('Solicitação de aprovação criada, mas nenhum email foi enviado. Verifique as configurações de email.', 'warning')
+                # Criar template de confirmação de submissão
+                confirmation_subject = f"Revisão Jurídica Submetida para Aprovação - {review.get('title', 'Documento')}"
+                confirmation_html = render_template(
+                    'emails/approval_confirmation.html',
+                    reviewer_name=reviewer_name, review=review,
+                    approvers_text=approvers_text, now=datetime.now()
+                )
                 
-                return redirect(get_return_url(review_id))
+                messages.append((reviewer_email, confirmation_subject, confirmation_html))
+            except Exception as e:
+                logger.error('Erro ao montar email de confirmação para solicitante: %s', e, exc_info=True)
+            
+            # E-mails para visualizadores informando nova versão/documento
+            try:
+                viewer_emails = review['viewer_emails']
                 
+                if viewer_emails:
+                    messages.extend(email_service.viewer_messages(viewer_emails, **_viewer_email_args(review_id, review)))
             except Exception as e:
-                logger.error(f'Erro ao solicitar aprovação: {str(e)}', exc_info=True)
-                flash(f'Erro ao solicitar aprovação: {str(e)}', 'error')
-        else:
-            flash('Selecione pelo menos um aprovador', 'error')
-    
-    # Obter lista de usuários do Connect
-    try:
-        # Passar contexto da requisição para incluir cookies de sessão
-        users = connect_api_service.get_users(request_context=request)
-        logger.info(f'Lista de usuários obtida para aprovação: {len(users)} usuários')
-        if len(users) == 0:
-            logger.warning('Lista de usuários vazia para aprovação - verifique se o Connect está acessível e autenticado')
-            flash('Nenhum usuário encontrado. Verifique a conexão com o Connect.', 'warning')
-    except Exception as e:
-        logger.error(f'Erro ao obter lista de usuários: {str(e)}', exc_info=True)
-        users = []
-        flash('Erro ao carregar lista de usuários. Tente novamente.', 'error')
+                logger.error("Erro ao montar e-mails para visualizadores: %s", e, exc_info=True)
+            
+            email_service.send_in_background(email_service.send_batch, messages)
+            
+            # Os emails seguem em segundo plano; falhas de envio ficam registradas no log
+            flash(f'Solicitação de aprovação enviada com sucesso! Emails sendo enviados para {len(approvers)} aprovador(es).', 'success')
+            
+            return redirect(get_return_url(review_id))
+            
+        except Exception as e:
+            logger.error('Erro ao solicitar aprovação: %s', e, exc_info=True)
+            flash(f'Erro ao solicitar aprovação: {str(e)}', 'error')
+    else:
+        flash('Selecione pelo menos um aprovador', 'error')
     
-    return_to = request.args.get('return_to', '')
-    return render_template('reviews/request_approval.html', review=review, users=users, return_to=return_to)
+    # Falha na solicitação: renderizar de novo com os usuários já obtidos neste POST
+    return _render_request_approval(review, list(users_by_email.values()) or None)
 
 
 @bp.route('/<int:review_id>/approve/switch-user', methods=['GET', 'POST'])
 def approve_switch_user_redirect(review_id):
     """Redireciona rota antiga (removida) para rota de aprovação direta"""
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.warning(f"Tentativa de acesso à rota antiga approve_switch_user para revisão {review_id}. Redirecionando para approve.")
+    logger.warning("Tentativa de acesso à rota antiga approve_switch_user para revisão %s. Redirecionando para approve.", review_id)
     
     # Se há token na URL, redirecionar para approve com token
     token = request.args.get('token') or request.form.get('token')
@@ -876,15 +774,16 @@ def approve_switch_user_redirect(review_id):
         return redirect(url_for('reviews.approve', review_id=review_id), code=301)
 
 
+def _connect_login_redirect(review_id):
+    """Redireciona para autenticação no Connect, voltando depois para a tela de aprovação"""
+    connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
+    return_url = external_url('reviews.approve', review_id=review_id)
+    return redirect(f"{connect_url}?return_url={quote(return_url, safe='')}")
+
+
 @bp.route('/<int:review_id>/approve', methods=['GET', 'POST'])
 def approve(review_id):
     """Aprova ou rejeita revisão - sempre requer autenticação via Connect"""
-    import logging
-    logger = logging.getLogger(__name__)
-    from flask import current_app
-    from flask_login import logout_user
-    from urllib.parse import quote
-    
     # Se for POST (submissão do formulário), processar diretamente
     # O usuário já está autenticado quando acessa a página
     if request.method == 'POST':
@@ -895,7 +794,7 @@ def approve(review_id):
         
         # Processar aprovação/rejeição diretamente
         action = request.form.get('action')
-        comments = request.form.get('comments', '').strip()
+        comments = _form_text(request.form, 'comments')
         
         if not comments:
             flash('Comentário é obrigatório', 'error')
@@ -906,53 +805,44 @@ def approve(review_id):
             else:
                 return redirect(url_for('reviews.pending_approvals'))
         
-        # Obter revisão
-        from app.db import fetchone
-        review = fetchone("""
-            SELECT r.*, d.title, d.summary, d.description
-            FROM revisoes_juridicas.reviews r
-            INNER JOIN revisoes_juridicas.documents d ON r.document_id = d.id
-            WHERE r.id = %s
-        """, (review_id,))
-        
-        if not review:
-            flash('Revisão não encontrada', 'error')
-            return redirect(url_for('reviews.pending_approvals'))
+        if action not in ('approve', 'reject'):
+            flash('Ação inválida', 'error')
+            token = session.get('approval_token')
+            if token:
+                return redirect(url_for('reviews.approve', review_id=review_id))
+            else:
+                return redirect(url_for('reviews.pending_approvals'))
         
         approver_email = current_user.email
         
-        # Verificar se há aprovação pendente
-        approval = review_approvals_repository.get_approval_by_token(review_id, approver_email)
-        
-        if not approval or approval.get('status') != 'pending':
-            flash('Aprovação não encontrada ou já processada', 'error')
-            return redirect(url_for('reviews.pending_approvals'))
-        
-        # Buscar nome do aprovador do Connect
-        users = connect_api_service.get_users(request_context=request)
-        approver_name = next((u.get('name', approver_email) for u in users if u.get('email') == approver_email), approver_email)
+        # Nome do aprovador já vem da sessão; o Connect só é consultado se faltar
+        approver_name = current_user.name or connect_api_service.get_user_name(approver_email, request_context=request)
         
+        # O UPDATE só afeta a aprovação pendente do usuário e já devolve a revisão
+        # (RETURNING) para o email, sem uma consulta prévia
         if action == 'approve':
-            review_approvals_repository.approve_review(review_id, approver_email, approver_name, comments)
+            review = review_approvals_repository.approve_review(review_id, approver_email, approver_name, comments)
             status = 'approved'
-        elif action == 'reject':
-            review_approvals_repository.reject_review(review_id, approver_email, approver_name, comments)
-            status = 'rejected'
         else:
-            flash('Ação inválida', 'error')
-            token = session.get('approval_token')
-            if token:
-                return redirect(url_for('reviews.approve', review_id=review_id))
-            else:
-                return redirect(url_for('reviews.pending_approvals'))
+            review = review_approvals_repository.reject_review(review_id, approver_email, approver_name, comments)
+            status = 'rejected'
+        
+        if not review:
+            flash('Aprovação não encontrada ou já processada', 'error')
+            return redirect(url_for('reviews.pending_approvals'))
+        
+        # As aprovações entram na exportação: descartar as versões em cache
+        # (seriam substituídas pelo hash só na próxima exportação)
+        export_service.invalidate_exports(current_app.config.get('EXPORT_CACHE_DIR'), [review_id])
         
         # Enviar email de confirmação ao responsável pela revisão
         reviewer_email = review.get('reviewer_email')
         reviewer_name = review.get('reviewer_name')
         
         if reviewer_email:
-            email_service.send_approval_confirmation_email(
-                reviewer_email, reviewer_name, approver_name, review, status, comments
+            email_service.send_in_background(
+                email_service.send_approval_confirmation_email,
+                reviewer_email, reviewer_name, approver_name, email_service.review_snapshot(review), status, comments
             )
         
         flash(f'Revisão {status} com sucesso!', 'success')
@@ -975,73 +865,35 @@ def approve(review_id):
     
     if token:
         try:
-            from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-            serializer = URLSafeTimedSerializer(os.getenv('SECRET_KEY'))
-            token_data = serializer.loads(token, max_age=86400)  # 24 horas
-            approver_email_from_token = token_data.get('approver_email')
+            token_data = _approval_serializer().loads(token, max_age=APPROVAL_TOKEN_MAX_AGE)
+            # Tokens emitidos antes da mudança ainda trazem um dict com review_id/approver_email
+            if isinstance(token_data, dict):
+                approver_email_from_token = token_data.get('approver_email')
+            else:
+                approver_email_from_token = token_data
         except Exception as e:
-            logger.error(f"Erro ao decodificar token: {str(e)}")
+            logger.error("Erro ao decodificar token: %s", e)
     
     # Se não há token, verificar se usuário está autenticado
     if not token:
         # Se usuário já está autenticado, permitir acesso direto
         if current_user.is_authenticated:
-            logger.info(f"Usuário {current_user.email} acessando aprovação sem token (já autenticado)")
+            logger.info("Usuário %s acessando aprovação sem token (já autenticado)", current_user.email)
             approver_email_no_token = current_user.email
         else:
             # Se não está autenticado, redirecionar para Connect
             logger.info("Token não fornecido e usuário não autenticado. Redirecionando para Connect.")
-            connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
-            
-            # Construir URL de retorno após autenticação
-            reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-            if not reviews_base_url:
-                server_name = current_app.config.get('SERVER_NAME')
-                preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-                if server_name:
-                    reviews_base_url = f"{preferred_scheme}://{server_name}"
-                else:
-                    reviews_base_url = request.host_url.rstrip('/')
-                    if ':5001' in reviews_base_url:
-                        reviews_base_url = reviews_base_url.replace(':5001', ':5002')
-            else:
-                reviews_base_url = reviews_base_url.rstrip('/')
-            
-            approval_path = url_for('reviews.approve', review_id=review_id)
-            return_url = f"{reviews_base_url}{approval_path}"
-            encoded_return_url = quote(return_url, safe='')
-            
-            return redirect(f"{connect_url}?return_url={encoded_return_url}")
+            return _connect_login_redirect(review_id)
     
     # Se há token mas usuário não está autenticado, redirecionar para Connect
     if not current_user.is_authenticated:
-        logger.info(f"Usuário não autenticado. Redirecionando para Connect para autenticação do aprovador: {approver_email_from_token}")
+        logger.info("Usuário não autenticado. Redirecionando para Connect para autenticação do aprovador: %s", approver_email_from_token)
         
         # Armazenar token na sessão para usar após autenticação
         session['approval_token'] = token
         session['approval_review_id'] = review_id
         
-        connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
-        
-        # Construir URL de retorno após autenticação
-        reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-        if not reviews_base_url:
-            server_name = current_app.config.get('SERVER_NAME')
-            preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-            if server_name:
-                reviews_base_url = f"{preferred_scheme}://{server_name}"
-            else:
-                reviews_base_url = request.host_url.rstrip('/')
-                if ':5001' in reviews_base_url:
-                    reviews_base_url = reviews_base_url.replace(':5001', ':5002')
-        else:
-            reviews_base_url = reviews_base_url.rstrip('/')
-        
-        approval_path = url_for('reviews.approve', review_id=review_id)
-        return_url = f"{reviews_base_url}{approval_path}"
-        encoded_return_url = quote(return_url, safe='')
-        
-        return redirect(f"{connect_url}?return_url={encoded_return_url}")
+        return _connect_login_redirect(review_id)
     
     # Se há token válido e usuário está logado, verificar se corresponde
     if token and approver_email_from_token and current_user.is_authenticated:
@@ -1050,7 +902,7 @@ def approve(review_id):
         
         # Se o usuário logado não corresponde ao aprovador do token, fazer logout e redirecionar para Connect
         if logged_user_email != token_approver_email:
-            logger.info(f"Usuário logado ({logged_user_email}) não corresponde ao aprovador do token ({token_approver_email}). Fazendo logout e redirecionando para Connect.")
+            logger.info("Usuário logado (%s) não corresponde ao aprovador do token (%s). Fazendo logout e redirecionando para Connect.", logged_user_email, token_approver_email)
             
             # Fazer logout do usuário atual no sistema de revisões
             logout_user()
@@ -1061,29 +913,8 @@ def approve(review_id):
             session['approval_review_id'] = review_id
             
             # Redirecionar direto para Connect (sem tela intermediária)
-            connect_url = current_app.config.get('CONNECT_URL', 'http://localhost:5001')
-            
-            # Construir URL de retorno após autenticação
-            reviews_base_url = os.getenv('REVIEWS_BASE_URL')
-            if not reviews_base_url:
-                server_name = current_app.config.get('SERVER_NAME')
-                preferred_scheme = current_app.config.get('PREFERRED_URL_SCHEME', 'http')
-                if server_name:
-                    reviews_base_url = f"{preferred_scheme}://{server_name}"
-                else:
-                    reviews_base_url = request.host_url.rstrip('/')
-                    if ':5001' in reviews_base_url:
-                        reviews_base_url = reviews_base_url.replace(':5001', ':5002')
-            else:
-                reviews_base_url = reviews_base_url.rstrip('/')
-            
-            approval_path = url_for('reviews.approve', review_id=review_id)
-            return_url = f"{reviews_base_url}{approval_path}"
-            encoded_return_url = quote(return_url, safe='')
-            
-            logger.info(f"Redirecionando para Connect para autenticação do usuário correto: {connect_url}?return_url={encoded_return_url}")
-            
-            return redirect(f"{connect_url}?return_url={encoded_return_url}")
+            logger.info("Redirecionando para Connect para autenticação do usuário correto")
+            return _connect_login_redirect(review_id)
     
     # Determinar qual email usar
     approver_email = None
@@ -1105,64 +936,19 @@ def approve(review_id):
         flash('Aprovador não identificado. Faça login ou use o link do email.', 'error')
         return redirect(url_for('reviews.pending_approvals'))
     
-    # Obter revisão (sem verificar permissão de visualização para aprovadores)
-    from app.db import fetchone
-    review = fetchone("""
-        SELECT r.*, d.title, d.summary, d.description
-        FROM revisoes_juridicas.reviews r
-        INNER JOIN revisoes_juridicas.documents d ON r.document_id = d.id
-        WHERE r.id = %s
-    """, (review_id,))
+    # Revisão completa (riscos, observações, aprovações) e a aprovação pendente do aprovador
+    # (case-insensitive) em uma única consulta; sem user_email, a permissão de visualização
+    # não é verificada: o aprovador é validado pela aprovação pendente
+    review = reviews_repository.get_review_full(review_id, approver_email=approver_email)
     
     if not review:
         flash('Revisão não encontrada', 'error')
         return redirect(url_for('reviews.pending_approvals'))
     
-    # Verificar se há aprovação pendente (comparação case-insensitive)
-    approval = review_approvals_repository.get_approval_by_token(review_id, approver_email)
-    
-    # Se não encontrou aprovação pendente, verificar se existe na lista de pendentes do usuário
-    if not approval or approval.get('status') != 'pending':
-        # Verificar se o usuário tem aprovações pendentes para esta revisão
-        pending_approvals = review_approvals_repository.get_pending_approvals(review_id)
-        approver_email_lower = approver_email.lower()
-        user_has_pending = any(
-            pa.get('approver_email', '').lower() == approver_email_lower 
-            for pa in pending_approvals
-        )
-        
-        if user_has_pending:
-            # Aprovação existe na lista, mas pode ter problema na busca específica
-            # Tentar buscar novamente com email normalizado ou redirecionar para lista
-            # Buscar todas as aprovações pendentes do usuário para esta revisão
-            from app.db import fetchall
-            user_approvals = fetchall("""
-                SELECT * FROM revisoes_juridicas.review_approvals
-                WHERE review_id = %s 
-                AND LOWER(approver_email) = LOWER(%s) 
-                AND status = 'pending'
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (review_id, approver_email))
-            
-            if user_approvals:
-                approval = user_approvals[0]
-            else:
-                # Aprovação existe mas não foi encontrada, redirecionar para lista sem erro
-                return redirect(url_for('reviews.pending_approvals'))
-        else:
-            # Realmente não existe aprovação pendente para este usuário
-            flash('Aprovação não encontrada ou já processada', 'error')
-            return redirect(url_for('reviews.pending_approvals'))
-    
-    # Carregar dados completos da revisão
-    risks = reviews_repository.get_review_risks(review_id)
-    observations = reviews_repository.get_review_observations(review_id)
-    approvals = review_approvals_repository.get_review_approvals(review_id)
-    
-    review['risks'] = risks
-    review['observations'] = observations.get('observations', '') if observations else ''
-    review['approvals'] = approvals
+    approval = review.pop('pending_approval')
+    if not approval:
+        flash('Aprovação não encontrada ou já processada', 'error')
+        return redirect(url_for('reviews.pending_approvals'))
     
     return render_template('reviews/approve.html', review=review, approval=approval, approver_email=approver_email)
 
@@ -1172,83 +958,93 @@ def approve(review_id):
 @require_action('view')
 def export(review_id):
     """Exporta revisão em PDF ou DOCX"""
-    review = reviews_repository.get_review_by_id(review_id, current_user.email)
-    
-    if not review:
-        flash('Revisão não encontrada ou sem permissão', 'error')
-        return redirect(url_for('reviews.manage'))
-    
     format_type = request.args.get('format', 'pdf').lower()
     include_history = request.args.get('include_history', 'false').lower() == 'true'
     
-    # Carregar dados completos
-    risks = reviews_repository.get_review_risks(review_id)
-    observations = reviews_repository.get_review_observations(review_id)
-    approvals = review_approvals_repository.get_review_approvals(review_id)
+    # Revisão com riscos, observações, aprovações e (se pedido) os históricos completos
+    # em uma única consulta
+    review = reviews_repository.get_review_full(review_id, current_user.email, include_history=include_history)
     
-    review['risks'] = risks
-    review['observations'] = observations.get('observations', '') if observations else ''
-    review['approvals'] = approvals
+    if not review:
+        flash('Revisão não encontrada ou sem permissão', 'error')
+        return redirect(url_for('reviews.manage'))
     
     try:
+        if format_type not in EXPORT_FORMATS:
+            flash('Formato inválido. Use pdf ou docx', 'error')
+            return redirect(get_return_url(review_id))
+        
         if include_history:
-            # Carregar históricos completos
-            versions_with_comments = reviews_repository.get_all_versions_with_comments(
-                review['document_id'], current_user.email
-            )
-            versions_with_risks = reviews_repository.get_all_versions_with_risks(
-                review['document_id'], current_user.email
-            )
+            # Históricos completos já vieram com a revisão
+            versions_with_comments = review.pop('versions_with_comments')
+            versions_with_risks = review.pop('versions_with_risks')
             
             if format_type == 'pdf':
-                pdf_data = export_service.export_to_pdf_with_history(
-                    review, versions_with_comments, versions_with_risks
-                )
-                filename = f"revisao_{review_id}_v{review['version']}_historico_completo.pdf"
-                return send_file(
-                    BytesIO(pdf_data),
-                    mimetype='application/pdf',
-                    as_attachment=True,
-                    download_name=filename
+                writer = lambda out: export_service.export_to_pdf_with_history(
+                    review, versions_with_comments, versions_with_risks, out=out
                 )
-            elif format_type == 'docx':
-                docx_data = export_service.export_to_docx_with_history(
-                    review, versions_with_comments, versions_with_risks
-                )
-                filename = f"revisao_{review_id}_v{review['version']}_historico_completo.docx"
-                return send_file(
-                    BytesIO(docx_data),
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                    as_attachment=True,
-                    download_name=filename
+            else:
+                writer = lambda out: export_service.export_to_docx_with_history(
+                    review, versions_with_comments, versions_with_risks, out=out
                 )
+            filename = f"revisao_{review_id}_v{review['version']}_historico_completo.{format_type}"
+            source_data = [review, versions_with_comments, versions_with_risks]
         else:
             # Exportação normal (apenas versão atual)
             if format_type == 'pdf':
-                pdf_data = export_service.export_to_pdf(review)
-                filename = f"revisao_{review_id}_v{review['version']}.pdf"
-                return send_file(
-                    BytesIO(pdf_data),
-                    mimetype='application/pdf',
-                    as_attachment=True,
-                    download_name=filename
-                )
-            elif format_type == 'docx':
-                docx_data = export_service.export_to_docx(review)
-                filename = f"revisao_{review_id}_v{review['version']}.docx"
-                return send_file(
-                    BytesIO(docx_data),
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                    as_attachment=True,
-                    download_name=filename
-                )
+                writer = lambda out: export_service.export_to_pdf(review, out=out)
+            else:
+                writer = lambda out: export_service.export_to_docx(review, out=out)
+            filename = f"revisao_{review_id}_v{review['version']}.{format_type}"
+            source_data = review
         
-        flash('Formato inválido. Use pdf ou docx', 'error')
-        return redirect(get_return_url(review_id))
+        # ETag pelo hash dos dados exportados: um download repetido sem alterações
+        # vira 304 antes mesmo de gerar (ou ler do cache) o arquivo
+        digest = export_service.export_digest(source_data)
+        etag = f"{digest}-{format_type}"
+        if request.if_none_match.contains(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+        
+        # Reaproveitar exportação já gerada com os mesmos dados (cache em disco)
+        cache_dir = current_app.config.get('EXPORT_CACHE_DIR')
+        if cache_dir:
+            path = export_service.get_cached_export(cache_dir, filename, source_data, writer, digest=digest)
+            
+            # Atrás do nginx: o próprio servidor web envia o arquivo em cache (sendfile)
+            accel_prefix = current_app.config.get('EXPORT_X_ACCEL_PREFIX')
+            if accel_prefix:
+                relative_path = os.path.relpath(path, cache_dir).replace(os.sep, '/')
+                response = Response('', headers={
+                    'X-Accel-Redirect': f"{accel_prefix.rstrip('/')}/{relative_path}",
+                    'Content-Type': EXPORT_FORMATS[format_type]
+                })
+                set_attachment_filename(response, filename)
+                response.set_etag(etag)
+                return response
+            
+            # Com USE_X_SENDFILE=True o Flask envia apenas o header X-Sendfile (Apache)
+            # Arquivo em disco: send_file também atende requisições Range (206)
+            return send_file(
+                path,
+                mimetype=EXPORT_FORMATS[format_type],
+                as_attachment=True,
+                download_name=filename,
+                conditional=True,
+                etag=etag
+            )
+        
+        # Last-Modified só na exportação da versão atual: o histórico completo
+        # depende de outras versões, e fica apenas com o ETag
+        last_modified = None if include_history else _export_last_modified(review)
+        return _send_export(writer, EXPORT_FORMATS[format_type], filename,
+                            etag=etag, last_modified=last_modified)
+    except HTTPException:
+        # Respostas HTTP das requisições condicionais/Range (ex: 416) vão direto ao cliente
+        raise
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'Erro ao exportar revisão: {str(e)}', exc_info=True)
+        logger.error('Erro ao exportar revisão: %s', e, exc_info=True)
         flash(f'Erro ao exportar revisão: {str(e)}', 'error')
         return redirect(get_return_url(review_id))
 
@@ -0,0 +1,106 @@
+"""
+Cache curto das consultas agregadas por usuário (dashboard e aprovações pendentes)
+"""
+
+import pickle
+import logging
+from functools import wraps
+from flask import current_app, has_app_context, request
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_PREFIX = 'revisoes_juridicas:cache:'
+_GENERATION_KEY = QUERY_CACHE_PREFIX + 'generation'
+
+
+class QueryCache:
+    """
+    Cache no Redis com invalidação por geração: cada valor é gravado junto com a
+    geração lida antes da consulta, e invalidate() apenas incrementa a geração
+    (compartilhada, então vale para todos os workers).
+    """
+    
+    def __init__(self, ttl: int, redis_client):
+        self.ttl = ttl
+        self.redis = redis_client
+    
+    def get(self, key: str):
+        """Retorna (geração, encontrado, valor)"""
+        try:
+            generation, raw = self.redis.mget(_GENERATION_KEY, QUERY_CACHE_PREFIX + key)
+        except Exception as e:
+            logger.warning('Cache de consultas indisponível: %s', e)
+            return None, False, None
+        
+        generation = int(generation or 0)
+        if raw:
+            stored_generation, value = pickle.loads(raw)
+            if stored_generation == generation:
+                return generation, True, value
+        return generation, False, None
+    
+    def set(self, key: str, generation, value) -> None:
+        """Grava o valor com a geração lida antes da consulta (None não grava)"""
+        if generation is None:
+            return
+        
+        try:
+            self.redis.set(QUERY_CACHE_PREFIX + key, pickle.dumps((generation, value)), ex=self.ttl)
+        except Exception as e:
+            logger.warning('Não foi possível gravar no cache de consultas: %s', e)
+    
+    def invalidate(self) -> None:
+        """Descarta todos os valores em cache (nova geração)"""
+        try:
+            self.redis.incr(_GENERATION_KEY)
+        except Exception as e:
+            logger.warning('Não foi possível invalidar o cache de consultas: %s', e)
+
+
+def cached_query(func):
+    """
+    Guarda o resultado da consulta no cache da aplicação (se habilitado), pela
+    função e argumentos. O valor é compartilhado: quem chama não deve alterá-lo.
+    """
+    key_prefix = f'{func.__module__}.{func.__qualname__}'
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions.get('query_cache') if has_app_context() else None
+        if cache is None:
+            return func(*args, **kwargs)
+        
+        key = f'{key_prefix}:{args!r}:{sorted(kwargs.items())!r}'
+        generation, hit, value = cache.get(key)
+        if hit:
+            return value
+        
+        value = func(*args, **kwargs)
+        cache.set(key, generation, value)
+        return value
+    
+    return wrapper
+
+
+def init_query_cache(app, invalidating_blueprints=('reviews', 'settings')) -> None:
+    """
+    Habilita o cache de consultas (QUERY_CACHE_TTL > 0) no Redis da sessão (REDIS_URL).
+    Sem Redis o cache fica desligado: um cache por processo só seria invalidado no
+    worker que tratou o POST, e os demais mostrariam dados antigos até o TTL expirar.
+    Todo POST bem-sucedido dos blueprints informados invalida o cache, pois são eles
+    que alteram revisões, viewers e aprovações.
+    """
+    ttl = app.config.get('QUERY_CACHE_TTL', 0)
+    redis_client = app.config.get('SESSION_REDIS')
+    if ttl <= 0 or redis_client is None:
+        return
+    
+    cache = QueryCache(ttl, redis_client)
+    app.extensions['query_cache'] = cache
+    
+    @app.after_request
+    def invalidate_query_cache(response):
+        if (request.method == 'POST' and response.status_code < 400
+                and request.blueprint in invalidating_blueprints):
+            cache.invalidate()
+        return response
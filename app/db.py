@@ -3,6 +3,7 @@ Módulo de conexão com banco de dados
 """
 
 import os
+import weakref
 import psycopg2
 import psycopg2.extras
 from psycopg2 import pool
@@ -13,12 +14,16 @@ from pathlib import Path
 
 # Carregar variáveis de ambiente
 _env_path = Path(__file__).resolve().parents[1] / 'config.env'
-if _env_path.exists():
+if not os.environ.get('_DOTENV_LOADED') and _env_path.exists():
     load_dotenv(dotenv_path=_env_path, override=True)
+    os.environ['_DOTENV_LOADED'] = '1'
 
-# Connection pool
+# Connection pool (ThreadedConnectionPool: consultas podem rodar em paralelo em threads)
 _connection_pool = None
 
+# Nomes dos prepared statements já criados em cada conexão (PREPARE vale por sessão)
+_prepared_statements = weakref.WeakKeyDictionary()
+
 
 def init_db_pool():
     """Inicializa o pool de conexões"""
@@ -31,13 +36,13 @@ def init_db_pool():
             
             if database_url:
                 # Parse da URL se necessário
-                _connection_pool = psycopg2.pool.SimpleConnectionPool(
+                _connection_pool = psycopg2.pool.ThreadedConnectionPool(
                     1, 20,
                     dsn=database_url
                 )
             else:
                 # Usar parâmetros individuais
-                _connection_pool = psycopg2.pool.SimpleConnectionPool(
+                _connection_pool = psycopg2.pool.ThreadedConnectionPool(
                     1, 20,
                     host=os.environ.get('DB_HOST', 'localhost'),
                     port=os.environ.get('DB_PORT', '5433'),
@@ -99,6 +104,60 @@ def fetchone(query: str, params: tuple = None) -> Optional[Dict]:
             return dict(result) if result else None
 
 
+def _is_stale_prepared_plan(error: Exception) -> bool:
+    """Prepared statement cujo resultado mudou após ALTER TABLE (ex: colunas de SELECT r.*)"""
+    return (isinstance(error, psycopg2.errors.FeatureNotSupported)
+            and 'cached plan must not change result type' in str(error))
+
+
+def _reprepare(conn, cur, name: str, query: str, deallocate: bool) -> None:
+    """
+    Prepara de novo um statement após falha no EXECUTE: a transação abortada é
+    desfeita e, se o statement antigo ainda existe na sessão, ele é descartado antes.
+    """
+    conn.rollback()
+    cur.execute("SET search_path TO revisoes_juridicas, public")
+    if deallocate:
+        cur.execute(f"DEALLOCATE {name}")
+    cur.execute(f"PREPARE {name} AS {query}")
+    _prepared_statements.setdefault(conn, set()).add(name)
+
+
+def fetchone_prepared(name: str, query: str, params: tuple) -> Optional[Dict]:
+    """
+    Executa uma consulta frequente como prepared statement e retorna um único resultado.
+    
+    O PREPARE é feito uma vez por conexão do pool; as execuções seguintes pulam
+    parse/planejamento. A query usa parâmetros posicionais do Postgres ($1, $2, ...).
+    Se o statement sumiu da sessão (DISCARD ALL, pgbouncer em modo transação) ou ficou
+    com o resultado desatualizado após uma migração (SELECT * com colunas alteradas),
+    ele é preparado de novo e a execução é repetida uma vez na mesma chamada.
+    """
+    placeholders = ', '.join(['%s'] * len(params))
+    
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            prepared = _prepared_statements.setdefault(conn, set())
+            if name not in prepared:
+                cur.execute(f"PREPARE {name} AS {query}")
+                prepared.add(name)
+            
+            execute_sql = f"EXECUTE {name} ({placeholders})"
+            try:
+                cur.execute(execute_sql, params)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # Sessão reiniciada no servidor: o statement não existe mais
+                _reprepare(conn, cur, name, query, deallocate=False)
+                cur.execute(execute_sql, params)
+            except psycopg2.errors.FeatureNotSupported as e:
+                if not _is_stale_prepared_plan(e):
+                    raise
+                _reprepare(conn, cur, name, query, deallocate=True)
+                cur.execute(execute_sql, params)
+            result = cur.fetchone()
+            return dict(result) if result else None
+
+
 def fetchall(query: str, params: tuple = None) -> List[Dict]:
     """Executa query e retorna todos os resultados"""
     with get_db_connection() as conn:
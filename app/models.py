@@ -1,6 +1,11 @@
+import logging
+from functools import lru_cache
+from flask import session
 from flask_login import UserMixin
 from .extensions import login_manager
 
+logger = logging.getLogger(__name__)
+
 
 class User(UserMixin):
     def __init__(self, email: str, name: str, profile_name: str = None, actions: list = None):
@@ -86,10 +91,20 @@ class User(UserMixin):
         return self.has_action('view') or len(self.actions) > 0
 
 
+@lru_cache(maxsize=1024)
+def _build_user(email: str, name: str, profile_name: str, actions: tuple) -> 'User':
+    """Cria (e memoiza por processo) o User a partir dos dados imutáveis da sessão"""
+    return User(
+        email=email,
+        name=name,
+        profile_name=profile_name,
+        actions=list(actions) if actions else None
+    )
+
+
 @login_manager.user_loader
 def load_user(user_id: str):
     """Carrega usuário da sessão"""
-    from flask import session
     if 'user_data' in session:
         user_data = session['user_data']
         # Manter a mesma lógica: se actions é None ou lista vazia, passar None
@@ -97,21 +112,19 @@ def load_user(user_id: str):
         actions = user_data.get('actions')
         if actions is None or (isinstance(actions, list) and len(actions) == 0):
             actions = None
-            # Atualizar a sessão para refletir a nova lógica
-            session['user_data']['actions'] = None
         
-        user = User(
-            email=user_data.get('email'),
-            name=user_data.get('name'),
-            profile_name=user_data.get('profile_name'),
-            actions=actions
+        # O email já é o user_id guardado pelo Flask-Login (_user_id);
+        # sessões antigas ainda podem trazer 'email' em user_data
+        user = _build_user(
+            user_id or user_data.get('email'),
+            user_data.get('name'),
+            user_data.get('profile_name'),
+            tuple(actions) if actions else None
         )
         
         # Debug: verificar se a lógica está funcionando
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Load user: {user.email} - Actions: {actions} - Has all: {user.has_all_permissions} - Can edit: {user.can_edit()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Load user: {user.email} - Actions: {actions} - Has all: {user.has_all_permissions} - Can edit: {user.can_edit()}")
         
         return user
     return None
-
@@ -2,12 +2,17 @@
 Repositório para sistema de aprovações
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
+from psycopg2.extras import execute_values
 from app.db import fetchall, fetchone, execute, get_db_connection
 
 
-def create_approval_request(review_id: int, requested_by: str, approver_emails: List[str]) -> int:
-    """Cria solicitação de aprovação e registros de aprovação pendentes"""
+def create_approval_request(review_id: int, requested_by: str, approver_emails: List[str],
+                            approver_names: Optional[Dict[str, str]] = None) -> int:
+    """
+    Cria solicitação de aprovação e registros de aprovação pendentes.
+    approver_names (email -> nome) evita buscar os usuários do Connect novamente.
+    """
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             # Criar solicitação
@@ -19,43 +24,53 @@ def create_approval_request(review_id: int, requested_by: str, approver_emails:
             """, (review_id, requested_by))
             request_id = cur.fetchone()[0]
             
-            # Criar registros de aprovação pendentes
-            for approver_email in approver_emails:
-                # Buscar nome do aprovador via Connect API
+            if approver_names is None:
+                # Buscar usuários via Connect API uma única vez, indexados por email
                 # Nota: Não temos contexto de requisição aqui, então tentamos sem cookies
                 # Se falhar, usamos o email como nome
+                from app.services.connect_api_service import connect_api_service
                 try:
-                    from app.services.connect_api_service import connect_api_service
-                    users = connect_api_service.get_users(request_context=None)
-                    approver_name = next((u.get('name', approver_email) for u in users if u.get('email') == approver_email), approver_email)
+                    users_by_email = connect_api_service.get_users_by_email(request_context=None)
                 except:
-                    approver_name = approver_email
-                
-                # Verificar se já existe aprovação para este review_id e approver_email
-                cur.execute("""
-                    SELECT id FROM revisoes_juridicas.review_approvals
-                    WHERE review_id = %s AND approver_email = %s
-                """, (review_id, approver_email))
-                existing = cur.fetchone()
+                    users_by_email = {}
+                approver_names = {
+                    email: connect_api_service.user_name_from(users_by_email, email)
+                    for email in approver_emails
+                }
+            
+            # Criar registros de aprovação pendentes (em lote)
+            unique_emails = list(dict.fromkeys(approver_emails))
+            rows = [
+                (review_id, approver_email, approver_names.get(approver_email) or approver_email)
+                for approver_email in unique_emails
+            ]
+            
+            if rows:
+                # Reabrir aprovações já existentes para estes aprovadores
+                updated = execute_values(cur, """
+                    UPDATE revisoes_juridicas.review_approvals ra
+                    SET status = 'pending',
+                        approver_name = v.approver_name,
+                        created_at = CURRENT_TIMESTAMP,
+                        approved_at = NULL,
+                        comments = ''
+                    FROM (VALUES %s) AS v(review_id, approver_email, approver_name)
+                    WHERE ra.review_id = v.review_id AND ra.approver_email = v.approver_email
+                    RETURNING ra.approver_email
+                """, rows, fetch=True)
+                updated_emails = {row[0] for row in updated}
                 
-                if existing:
-                    # Atualizar aprovação existente para pending
-                    cur.execute("""
-                        UPDATE revisoes_juridicas.review_approvals
-                        SET status = 'pending',
-                            approver_name = %s,
-                            created_at = CURRENT_TIMESTAMP,
-                            approved_at = NULL,
-                            comments = ''
-                        WHERE review_id = %s AND approver_email = %s
-                    """, (approver_name, review_id, approver_email))
-                else:
-                    # Criar nova aprovação
-                    cur.execute("""
+                # Criar novas aprovações para os demais
+                new_rows = [
+                    (rid, email, name, 'pending', '')
+                    for rid, email, name in rows if email not in updated_emails
+                ]
+                if new_rows:
+                    execute_values(cur, """
                         INSERT INTO revisoes_juridicas.review_approvals 
                         (review_id, approver_email, approver_name, status, comments)
-                        VALUES (%s, %s, %s, 'pending', '')
-                    """, (review_id, approver_email, approver_name))
+                        VALUES %s
+                    """, new_rows)
             
             conn.commit()
             return request_id
@@ -70,28 +85,35 @@ def get_pending_approvals(review_id: int) -> List[dict]:
     """, (review_id,))
 
 
-def approve_review(review_id: int, approver_email: str, approver_name: str, comments: str) -> bool:
-    """Aprova uma revisão"""
-    execute("""
-        UPDATE revisoes_juridicas.review_approvals
-        SET status = 'approved',
+def _decide_approval(review_id: int, approver_email: str, status: str, comments: str) -> Optional[dict]:
+    """
+    Registra a decisão na aprovação pendente e, no mesmo comando (RETURNING),
+    devolve a revisão com os dados do documento para o email de confirmação.
+    Retorna None se não houver aprovação pendente do aprovador para a revisão.
+    O email é comparado sem diferenciar maiúsculas, como na tela de aprovação
+    (índice idx_review_approvals_pending_email_lower).
+    """
+    return fetchone("""
+        UPDATE revisoes_juridicas.review_approvals ra
+        SET status = %s,
             approved_at = CURRENT_TIMESTAMP,
             comments = %s
-        WHERE review_id = %s AND approver_email = %s AND status = 'pending'
-    """, (comments, review_id, approver_email))
-    return True
+        FROM revisoes_juridicas.reviews r
+        INNER JOIN revisoes_juridicas.documents d ON r.document_id = d.id
+        WHERE ra.review_id = %s AND LOWER(ra.approver_email) = LOWER(%s) AND ra.status = 'pending'
+        AND r.id = ra.review_id
+        RETURNING r.*, d.title, d.summary, d.description
+    """, (status, comments, review_id, approver_email))
 
 
-def reject_review(review_id: int, approver_email: str, approver_name: str, comments: str) -> bool:
-    """Rejeita uma revisão"""
-    execute("""
-        UPDATE revisoes_juridicas.review_approvals
-        SET status = 'rejected',
-            approved_at = CURRENT_TIMESTAMP,
-            comments = %s
-        WHERE review_id = %s AND approver_email = %s AND status = 'pending'
-    """, (comments, review_id, approver_email))
-    return True
+def approve_review(review_id: int, approver_email: str, approver_name: str, comments: str) -> Optional[dict]:
+    """Aprova uma revisão (retorna a revisão, ou None se não havia aprovação pendente)"""
+    return _decide_approval(review_id, approver_email, 'approved', comments)
+
+
+def reject_review(review_id: int, approver_email: str, approver_name: str, comments: str) -> Optional[dict]:
+    """Rejeita uma revisão (retorna a revisão, ou None se não havia aprovação pendente)"""
+    return _decide_approval(review_id, approver_email, 'rejected', comments)
 
 
 def get_review_approvals(review_id: int) -> List[dict]:
@@ -107,18 +129,6 @@ def get_review_approvals(review_id: int) -> List[dict]:
     """, (review_id,))
 
 
-def get_approval_by_token(review_id: int, approver_email: str) -> Optional[dict]:
-    """Obtém aprovação pendente por email do aprovador (comparação case-insensitive)"""
-    return fetchone("""
-        SELECT * FROM revisoes_juridicas.review_approvals
-        WHERE review_id = %s 
-        AND LOWER(approver_email) = LOWER(%s) 
-        AND status = 'pending'
-        ORDER BY created_at DESC
-        LIMIT 1
-    """, (review_id, approver_email))
-
-
 def update_approval_request_status(review_id: int, status: str) -> None:
     """Atualiza status da solicitação de aprovação"""
     execute("""
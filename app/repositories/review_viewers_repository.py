@@ -3,30 +3,46 @@ Repositório para controle de visualização de revisões
 """
 
 from typing import List
-from app.db import fetchall, fetchone, execute, get_db_connection
+from app.db import fetchone, execute
 
 
 def add_viewers(review_id: int, user_emails: List[str]) -> None:
-    """Adiciona visualizadores a uma revisão"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            for email in user_emails:
-                cur.execute("""
-                    INSERT INTO revisoes_juridicas.review_viewers (review_id, user_email, can_view)
-                    VALUES (%s, %s, TRUE)
-                    ON CONFLICT (review_id, user_email) DO UPDATE SET can_view = TRUE
-                """, (review_id, email))
-        conn.commit()
-
-
-def get_viewers(review_id: int) -> List[dict]:
-    """Obtém lista de visualizadores de uma revisão"""
-    return fetchall("""
-        SELECT user_email, granted_at
-        FROM revisoes_juridicas.review_viewers
-        WHERE review_id = %s AND can_view = TRUE
-        ORDER BY granted_at
-    """, (review_id,))
+    """
+    Adiciona visualizadores a uma revisão em um único comando.
+    A lista vai como um array (unnest); vazios e duplicados são removidos no próprio SQL.
+    """
+    if not user_emails:
+        return
+    
+    execute("""
+        INSERT INTO revisoes_juridicas.review_viewers (review_id, user_email, can_view)
+        SELECT DISTINCT %s, email, TRUE
+        FROM unnest(%s::text[]) AS email
+        WHERE email <> ''
+        ON CONFLICT (review_id, user_email) DO UPDATE SET can_view = TRUE
+    """, (review_id, list(user_emails)))
+
+
+def set_viewers(review_id: int, user_emails: List[str]) -> None:
+    """
+    Define exatamente quem visualiza a revisão: remove quem não está na lista
+    e insere/atualiza os demais, em um único comando (CTE com DELETE + INSERT).
+    """
+    execute("""
+        WITH emails AS (
+            SELECT DISTINCT email
+            FROM unnest(%s::text[]) AS email
+            WHERE email <> ''
+        ),
+        removed AS (
+            DELETE FROM revisoes_juridicas.review_viewers rv
+            WHERE rv.review_id = %s
+            AND rv.user_email NOT IN (SELECT email FROM emails)
+        )
+        INSERT INTO revisoes_juridicas.review_viewers (review_id, user_email, can_view)
+        SELECT %s, email, TRUE FROM emails
+        ON CONFLICT (review_id, user_email) DO UPDATE SET can_view = TRUE
+    """, (list(user_emails), review_id, review_id))
 
 
 def can_user_view(review_id: int, user_email: str) -> bool:
@@ -36,12 +52,3 @@ def can_user_view(review_id: int, user_email: str) -> bool:
         WHERE review_id = %s AND user_email = %s AND can_view = TRUE
     """, (review_id, user_email))
     return result is not None
-
-
-def remove_viewer(review_id: int, user_email: str) -> None:
-    """Remove permissão de visualização de um usuário"""
-    execute("""
-        DELETE FROM revisoes_juridicas.review_viewers
-        WHERE review_id = %s AND user_email = %s
-    """, (review_id, user_email))
-
@@ -2,8 +2,17 @@
 Repositório para acesso a dados de revisões
 """
 
-from typing import List, Dict, Optional
-from app.db import fetchone, fetchall, execute, execute_returning
+import re
+import logging
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from app.cache import cached_query
+from app.db import fetchone, fetchone_prepared, fetchall, execute, execute_returning, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Frações de segundo vindas do json_agg (PostgreSQL remove zeros à direita)
+_JSON_TS_FRACTION = re.compile(r'\.(\d{1,6})')
 
 
 def list_reviews(user_email: str, filters: Dict = None, page: int = 1, per_page: int = 10) -> List[Dict]:
@@ -122,11 +131,229 @@ def get_review_by_id(review_id: int, user_email: str) -> Optional[Dict]:
     return fetchone(query, (review_id, user_email))
 
 
+def get_review_with_viewer_emails(review_id: int, user_email: str) -> Optional[Dict]:
+    """
+    Como get_review_by_id, mas já traz os emails dos visualizadores (viewer_emails)
+    na mesma consulta, evitando uma ida extra ao banco para buscá-los.
+    """
+    return fetchone("""
+        SELECT 
+            r.*,
+            d.title,
+            d.summary,
+            d.description,
+            d.created_by as document_created_by,
+            d.created_at as document_created_at,
+            d.document_version,
+            d.review_version,
+            d.risk_version,
+            ARRAY(
+                SELECT v.user_email
+                FROM revisoes_juridicas.review_viewers v
+                WHERE v.review_id = r.id AND v.can_view = TRUE
+                ORDER BY v.granted_at
+            ) AS viewer_emails
+        FROM revisoes_juridicas.reviews r
+        INNER JOIN revisoes_juridicas.documents d ON r.document_id = d.id
+        INNER JOIN revisoes_juridicas.review_viewers rv ON r.id = rv.review_id
+        WHERE r.id = %s AND rv.user_email = %s AND rv.can_view = TRUE
+    """, (review_id, user_email))
+
+
+def _parse_json_timestamps(items: List[Dict], fields: tuple) -> List[Dict]:
+    """
+    Converte de volta para datetime os timestamps serializados pelo json_agg,
+    para que templates e exportação possam continuar usando strftime.
+    """
+    for item in items:
+        for field in fields:
+            value = item.get(field)
+            if isinstance(value, str):
+                try:
+                    normalized = _JSON_TS_FRACTION.sub(lambda m: '.' + m.group(1).ljust(6, '0'), value, count=1)
+                    item[field] = datetime.fromisoformat(normalized)
+                except ValueError:
+                    pass
+    return items
+
+
+# Consulta de detalhe/exportação/aprovação (a mais frequente): executada como prepared statement.
+# $1 = email para a permissão de visualização (NULL não verifica), $2 = id da revisão,
+# $3 = email do aprovador para trazer a aprovação pendente (NULL não busca),
+# $4 = incluir os históricos de comentários e riscos de todas as versões
+_REVIEW_FULL_SQL = """
+    SELECT 
+        r.*,
+        d.title,
+        d.summary,
+        d.description,
+        d.created_by as document_created_by,
+        d.created_at as document_created_at,
+        d.updated_at as document_updated_at,
+        d.document_version,
+        d.review_version,
+        d.risk_version,
+        COALESCE(risks.items, '[]'::json) as risks,
+        COALESCE(obs.observations, '') as observations,
+        obs.updated_at as observations_updated_at,
+        COALESCE(approvals.items, '[]'::json) as approvals,
+        COALESCE(docs.items, '[]'::json) as documents,
+        COALESCE(versions.items, '[]'::json) as all_versions,
+        pending.item as pending_approval,
+        COALESCE(version_comments.items, '[]'::json) as versions_with_comments,
+        COALESCE(version_risks.items, '[]'::json) as versions_with_risks
+    FROM revisoes_juridicas.reviews r
+    INNER JOIN revisoes_juridicas.documents d ON r.document_id = d.id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.id) as items
+        FROM (
+            SELECT rr.*, rc.name as category_name
+            FROM revisoes_juridicas.review_risks rr
+            LEFT JOIN revisoes_juridicas.risk_categories rc ON rr.category_id = rc.id
+            WHERE rr.review_id = r.id
+        ) x
+    ) risks ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT ro.observations, ro.updated_at
+        FROM revisoes_juridicas.review_observations ro
+        WHERE ro.review_id = r.id
+        LIMIT 1
+    ) obs ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.approved_at DESC NULLS LAST, x.created_at DESC) as items
+        FROM (
+            SELECT ra.*, rva.version
+            FROM revisoes_juridicas.review_approvals ra
+            INNER JOIN revisoes_juridicas.reviews rva ON ra.review_id = rva.id
+            WHERE rva.document_id = r.document_id
+        ) x
+    ) approvals ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(rd ORDER BY rd.uploaded_at DESC) as items
+        FROM revisoes_juridicas.review_documents rd
+        WHERE rd.review_id = r.id
+    ) docs ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.version DESC) as items
+        FROM (
+            SELECT rvs.id as review_id, rvs.version, rvs.reviewer_name, rvs.review_date
+            FROM revisoes_juridicas.reviews rvs
+            INNER JOIN revisoes_juridicas.review_viewers rvv ON rvs.id = rvv.review_id
+            WHERE rvs.document_id = r.document_id
+            AND rvv.user_email = $1
+            AND rvv.can_view = TRUE
+        ) x
+    ) versions ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT row_to_json(ra) as item
+        FROM revisoes_juridicas.review_approvals ra
+        WHERE $3::text IS NOT NULL
+        AND ra.review_id = r.id
+        AND LOWER(ra.approver_email) = LOWER($3)
+        AND ra.status = 'pending'
+        ORDER BY ra.created_at DESC
+        LIMIT 1
+    ) pending ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.version DESC) as items
+        FROM (
+            SELECT
+                rvs.id as review_id,
+                rvs.version,
+                rvs.reviewer_name,
+                rvs.review_date,
+                json_agg(
+                    json_build_object(
+                        'comment', rc.comments,
+                        'review_date', rc.review_date,
+                        'reviewer_name', rc.reviewer_name,
+                        'reviewer_email', rc.reviewer_email
+                    ) ORDER BY rc.review_date
+                ) as comments_list
+            FROM revisoes_juridicas.reviews rvs
+            INNER JOIN revisoes_juridicas.review_viewers rvv ON rvs.id = rvv.review_id
+            INNER JOIN revisoes_juridicas.review_comments rc ON rc.review_id = rvs.id
+            WHERE $4::boolean
+            AND rvs.document_id = r.document_id
+            AND rvv.user_email = $1
+            AND rvv.can_view = TRUE
+            GROUP BY rvs.id, rvs.version, rvs.reviewer_name, rvs.review_date
+        ) x
+    ) version_comments ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.version DESC) as items
+        FROM (
+            SELECT
+                rvs.id as review_id,
+                rvs.version,
+                rvs.reviewer_name,
+                rvs.review_date,
+                json_agg(
+                    json_build_object(
+                        'risk_text', rr.risk_text,
+                        'legal_suggestion', rr.legal_suggestion,
+                        'final_definition', rr.final_definition,
+                        'category_name', rc.name
+                    ) ORDER BY rr.id
+                ) as risks_list
+            FROM revisoes_juridicas.reviews rvs
+            INNER JOIN revisoes_juridicas.review_viewers rvv ON rvs.id = rvv.review_id
+            INNER JOIN revisoes_juridicas.review_risks rr ON rr.review_id = rvs.id
+            LEFT JOIN revisoes_juridicas.risk_categories rc ON rr.category_id = rc.id
+            WHERE $4::boolean
+            AND rvs.document_id = r.document_id
+            AND rvv.user_email = $1
+            AND rvv.can_view = TRUE
+            GROUP BY rvs.id, rvs.version, rvs.reviewer_name, rvs.review_date
+        ) x
+    ) version_risks ON TRUE
+    WHERE r.id = $2
+    AND ($1::text IS NULL OR EXISTS (
+        SELECT 1 FROM revisoes_juridicas.review_viewers rv
+        WHERE rv.review_id = r.id AND rv.user_email = $1 AND rv.can_view = TRUE
+    ))
+"""
+
+
+def get_review_full(review_id: int, user_email: Optional[str] = None,
+                    approver_email: Optional[str] = None,
+                    include_history: bool = False) -> Optional[Dict]:
+    """
+    Obtém a revisão com todos os dados relacionados em uma única consulta
+    (riscos, observações, aprovações, documentos anexos e versões do documento).
+    Retorna None se a revisão não existir ou o usuário não tiver permissão.
+    
+    Sem user_email (ex: aprovadores, validados pela aprovação pendente) a permissão
+    de visualização não é verificada e all_versions vem vazio.
+    Com approver_email, 'pending_approval' traz a aprovação pendente desse aprovador
+    (comparação case-insensitive) ou None.
+    Com include_history, traz também os históricos de todas as versões visíveis ao usuário:
+    'versions_with_comments' (com 'comments_list') e 'versions_with_risks' (com 'risks_list').
+    """
+    review = fetchone_prepared('review_full', _REVIEW_FULL_SQL,
+                               (user_email, review_id, approver_email, include_history))
+    if not review:
+        return None
+    
+    if include_history:
+        _parse_json_timestamps(review['versions_with_comments'], ('review_date',))
+        _parse_json_timestamps(review['versions_with_risks'], ('review_date',))
+    else:
+        del review['versions_with_comments']
+        del review['versions_with_risks']
+    
+    _parse_json_timestamps(review['risks'], ('created_at', 'updated_at'))
+    _parse_json_timestamps(review['approvals'], ('approved_at', 'created_at'))
+    _parse_json_timestamps(review['documents'], ('uploaded_at',))
+    _parse_json_timestamps(review['all_versions'], ('review_date',))
+    if review['pending_approval']:
+        _parse_json_timestamps([review['pending_approval']], ('approved_at', 'created_at'))
+    return review
+
+
 def create_review(document_data: Dict, review_data: Dict, risks_data: List[Dict], 
                   observations: str, user_email: str, user_name: str) -> int:
     """Cria uma nova revisão"""
-    from app.db import get_db_connection
-    
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             # Criar documento se não existir
@@ -187,8 +414,6 @@ def update_review(review_id: int, document_data: Dict, review_data: Dict,
     Atualiza documento com versionamento independente.
     Retorna o ID da review (pode ser nova ou a mesma se nada mudou).
     """
-    from app.db import get_db_connection
-    
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             # Obter document_id e review atual
@@ -311,45 +536,54 @@ def update_review(review_id: int, document_data: Dict, review_data: Dict,
             return new_review_id
 
 
-def delete_review(review_id: int) -> bool:
+def delete_review_if_permitted(review_id: int, user_email: str) -> Optional[Dict]:
     """
-    Exclui TODAS as revisões de um documento (hard delete).
-    Quando o usuário exclui uma revisão, todas as versões do documento são excluídas.
+    Exclui o documento da revisão (e, via ON DELETE CASCADE, TODAS as suas versões)
+    em um único comando, se o usuário puder visualizar a revisão.
+    
+    Returns:
+        Dict com 'file_paths' (caminhos distintos dos anexos do documento, para remoção
+        do disco) e 'review_ids' (versões excluídas, para limpar o cache de exportação),
+        ou None se a revisão não existir ou o usuário não tiver permissão.
     """
-    from app.db import get_db_connection
+    result = fetchone("""
+        WITH target AS (
+            SELECT r.document_id
+            FROM revisoes_juridicas.reviews r
+            WHERE r.id = %s
+            AND EXISTS (
+                SELECT 1 FROM revisoes_juridicas.review_viewers rv
+                WHERE rv.review_id = r.id AND rv.user_email = %s AND rv.can_view = TRUE
+            )
+        ),
+        versions AS (
+            SELECT r.id
+            FROM revisoes_juridicas.reviews r
+            INNER JOIN target t ON r.document_id = t.document_id
+        ),
+        files AS (
+            SELECT DISTINCT rd.file_path
+            FROM revisoes_juridicas.review_documents rd
+            INNER JOIN versions v ON rd.review_id = v.id
+        ),
+        deleted AS (
+            DELETE FROM revisoes_juridicas.documents d
+            USING target t
+            WHERE d.id = t.document_id
+            RETURNING d.id
+        )
+        SELECT
+            (SELECT id FROM deleted) as document_id,
+            ARRAY(SELECT file_path FROM files) as file_paths,
+            ARRAY(SELECT id FROM versions) as review_ids
+    """, (review_id, user_email))
     
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            # Obter document_id da revisão
-            cur.execute("""
-                SELECT document_id FROM revisoes_juridicas.reviews WHERE id = %s
-            """, (review_id,))
-            result = cur.fetchone()
-            
-            if not result:
-                return False
-            
-            document_id = result[0]
-            
-            # Excluir TODAS as revisões do documento
-            # CASCADE excluirá automaticamente:
-            # - review_risks
-            # - review_observations
-            # - review_documents
-            # - review_viewers
-            # - review_approvals
-            # - review_comments
-            cur.execute("""
-                DELETE FROM revisoes_juridicas.reviews WHERE document_id = %s
-            """, (document_id,))
-            
-            # Excluir o documento também
-            cur.execute("""
-                DELETE FROM revisoes_juridicas.documents WHERE id = %s
-            """, (document_id,))
-            
-            conn.commit()
-            return True
+    if not result or result['document_id'] is None:
+        return None
+    return {
+        'file_paths': list(result['file_paths']),
+        'review_ids': list(result['review_ids'])
+    }
 
 
 def get_review_versions(document_id: int, user_email: str) -> List[Dict]:
@@ -382,14 +616,7 @@ def get_review_risks(review_id: int) -> List[Dict]:
     """, (review_id,))
 
 
-def get_review_observations(review_id: int) -> Optional[Dict]:
-    """Obtém observações de uma revisão"""
-    return fetchone("""
-        SELECT * FROM revisoes_juridicas.review_observations
-        WHERE review_id = %s
-    """, (review_id,))
-
-
+@cached_query
 def get_dashboard_stats(user_email: str) -> Dict:
     """Obtém estatísticas para o dashboard - alinhado com a lógica de status da lista"""
     stats = {}
@@ -488,6 +715,7 @@ def get_dashboard_stats(user_email: str) -> Dict:
     return stats
 
 
+@cached_query
 def get_recent_reviews_list(user_email: str, page: int = 1, per_page: int = 10) -> List[Dict]:
     """Obtém lista de revisões recentes para o dashboard (apenas última versão de cada documento)"""
     offset = (page - 1) * per_page
@@ -532,6 +760,7 @@ def get_recent_reviews_list(user_email: str, page: int = 1, per_page: int = 10)
     """, (user_email, per_page, offset))
 
 
+@cached_query
 def count_recent_reviews(user_email: str) -> int:
     """Conta o total de revisões recentes (apenas última versão de cada documento)"""
     result = fetchone("""
@@ -655,6 +884,7 @@ def get_reviewers_with_reviews(user_email: str) -> List[Dict]:
     """, (user_email,))
 
 
+@cached_query
 def get_pending_approvals_for_user(approver_email: str) -> List[Dict]:
     """Obtém revisões pendentes de aprovação para um aprovador específico"""
     return fetchall("""
@@ -702,8 +932,6 @@ def add_review_comments(review_id: int, comments_list: List[Dict]) -> bool:
     Returns:
         True se sucesso, False caso contrário
     """
-    from app.db import get_db_connection
-    
     if not comments_list:
         return True
     
@@ -725,180 +953,45 @@ def add_review_comments(review_id: int, comments_list: List[Dict]) -> bool:
                 conn.commit()
                 return True
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Erro ao adicionar comentários de revisão: {str(e)}", exc_info=True)
         return False
 
 
-def get_review_comments(review_id: int) -> List[Dict]:
-    """
-    Busca todos os comentários de uma versão específica.
-    
-    Args:
-        review_id: ID da versão (review)
-    
-    Returns:
-        Lista de comentários ordenados por data
-    """
-    return fetchall("""
-        SELECT 
-            id,
-            review_id,
-            reviewer_email,
-            reviewer_name,
-            review_date,
-            comments,
-            created_at
-        FROM revisoes_juridicas.review_comments
-        WHERE review_id = %s
-        ORDER BY review_date ASC
-    """, (review_id,))
-
-
-def get_all_document_versions(document_id: int, user_email: str) -> List[Dict]:
-    """
-    Busca TODAS as versões de um documento (independente de ter comentários ou riscos).
-    Mostra qualquer alteração feita no documento.
-    
-    Args:
-        document_id: ID do documento
-        user_email: Email do usuário (para verificar permissão)
-    
-    Returns:
-        Lista de todas as versões do documento:
-        [{
-            'review_id': int,
-            'version': int,
-            'reviewer_name': str,
-            'review_date': datetime
-        }, ...]
-    """
-    query = """
-        SELECT 
-            r.id as review_id,
-            r.version,
-            r.reviewer_name,
-            r.review_date
-        FROM revisoes_juridicas.reviews r
-        INNER JOIN revisoes_juridicas.review_viewers rv ON r.id = rv.review_id
-        WHERE r.document_id = %s 
-        AND rv.user_email = %s 
-        AND rv.can_view = TRUE
-        GROUP BY r.id, r.version, r.reviewer_name, r.review_date
-        ORDER BY r.version DESC
+def get_existing_texts(review_id: int, comment_texts: List[str], risk_texts: List[str]) -> Tuple[set, set]:
     """
+    Dentre os textos candidatos, retorna os que já existem na versão informada.
     
-    return fetchall(query, (document_id, user_email))
-
-
-def get_all_versions_with_comments(document_id: int, user_email: str) -> List[Dict]:
-    """
-    Busca todas as versões de um documento com seus comentários agrupados.
-    Apenas versões que o usuário tem permissão de visualizar e que possuem comentários.
+    Uma única consulta devolve só os textos coincidentes (comentários e riscos),
+    sem trazer as linhas completas para comparar em Python.
     
     Args:
-        document_id: ID do documento
-        user_email: Email do usuário (para verificar permissão)
-    
-    Returns:
-        Lista de versões com comentários agrupados:
-        [{
-            'review_id': int,
-            'version': int,
-            'reviewer_name': str,
-            'review_date': datetime,
-            'comments_list': [{'comment': str, 'review_date': datetime, 'reviewer_name': str}, ...]
-        }, ...]
-    """
-    query = """
-        SELECT 
-            r.id as review_id,
-            r.version,
-            r.reviewer_name,
-            r.review_date,
-            json_agg(
-                json_build_object(
-                    'comment', rc.comments,
-                    'review_date', rc.review_date,
-                    'reviewer_name', rc.reviewer_name,
-                    'reviewer_email', rc.reviewer_email
-                ) ORDER BY rc.review_date
-            ) as comments_list
-        FROM revisoes_juridicas.reviews r
-        INNER JOIN revisoes_juridicas.review_viewers rv ON r.id = rv.review_id
-        INNER JOIN revisoes_juridicas.review_comments rc ON rc.review_id = r.id
-        WHERE r.document_id = %s 
-        AND rv.user_email = %s 
-        AND rv.can_view = TRUE
-        GROUP BY r.id, r.version, r.reviewer_name, r.review_date
-        ORDER BY r.version DESC
-    """
-    
-    results = fetchall(query, (document_id, user_email))
-    
-    # Converter JSON string para lista Python
-    import json
-    for result in results:
-        if isinstance(result.get('comments_list'), str):
-            result['comments_list'] = json.loads(result['comments_list'])
-    
-    return results
-
-
-def get_all_versions_with_risks(document_id: int, user_email: str) -> List[Dict]:
-    """
-    Busca todas as versões de um documento com seus riscos agrupados.
-    Apenas versões que o usuário tem permissão de visualizar e que possuem riscos.
-    
-    Args:
-        document_id: ID do documento
-        user_email: Email do usuário (para verificar permissão)
+        review_id: ID da versão (review)
+        comment_texts: Comentários candidatos (já sem espaços nas pontas)
+        risk_texts: Textos de risco candidatos (já sem espaços nas pontas)
     
     Returns:
-        Lista de versões com riscos agrupados:
-        [{
-            'review_id': int,
-            'version': int,
-            'reviewer_name': str,
-            'review_date': datetime,
-            'risks_list': [{'risk_text': str, 'legal_suggestion': str, 'final_definition': str}, ...]
-        }, ...]
-    """
-    query = """
-        SELECT 
-            r.id as review_id,
-            r.version,
-            r.reviewer_name,
-            r.review_date,
-            json_agg(
-                json_build_object(
-                    'risk_text', rr.risk_text,
-                    'legal_suggestion', rr.legal_suggestion,
-                    'final_definition', rr.final_definition,
-                    'category_name', rc.name
-                ) ORDER BY rr.id
-            ) as risks_list
-        FROM revisoes_juridicas.reviews r
-        INNER JOIN revisoes_juridicas.review_viewers rv ON r.id = rv.review_id
-        INNER JOIN revisoes_juridicas.review_risks rr ON rr.review_id = r.id
-        LEFT JOIN revisoes_juridicas.risk_categories rc ON rr.category_id = rc.id
-        WHERE r.document_id = %s 
-        AND rv.user_email = %s 
-        AND rv.can_view = TRUE
-        GROUP BY r.id, r.version, r.reviewer_name, r.review_date
-        ORDER BY r.version DESC
+        Tupla (comentários existentes, riscos existentes)
     """
+    if not comment_texts and not risk_texts:
+        return set(), set()
     
-    results = fetchall(query, (document_id, user_email))
-    
-    # Converter JSON string para lista Python
-    import json
-    for result in results:
-        if isinstance(result.get('risks_list'), str):
-            result['risks_list'] = json.loads(result['risks_list'])
+    result = fetchone("""
+        SELECT
+            ARRAY(
+                SELECT btrim(rcm.comments)
+                FROM revisoes_juridicas.review_comments rcm
+                WHERE rcm.review_id = %s AND btrim(rcm.comments) = ANY(%s::text[])
+            ) AS comments,
+            ARRAY(
+                SELECT btrim(rr.risk_text)
+                FROM revisoes_juridicas.review_risks rr
+                WHERE rr.review_id = %s AND btrim(rr.risk_text) = ANY(%s::text[])
+            ) AS risks
+    """, (review_id, list(comment_texts), review_id, list(risk_texts)))
     
-    return results
+    if not result:
+        return set(), set()
+    return set(result['comments'] or []), set(result['risks'] or [])
 
 
 def has_new_or_modified_risks(current_risks: List[Dict], previous_review_id: int) -> bool:
@@ -913,9 +1006,6 @@ def has_new_or_modified_risks(current_risks: List[Dict], previous_review_id: int
     Returns:
         True se há riscos novos ou modificados, False caso contrário
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         # Buscar riscos da versão anterior
         previous_risks = get_review_risks(previous_review_id)
@@ -3,18 +3,47 @@ Serviço para integração com API do Connect
 """
 
 import os
+import time
 import requests
 import logging
+import threading
 import jwt
+import psycopg2
+from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from cachetools import TTLCache
-from flask import current_app, request, session
+from flask import current_app, request, session, g, has_app_context
 
 logger = logging.getLogger(__name__)
 
-# Cache de usuários com TTL de 5 minutos
-_users_cache = TTLCache(maxsize=1, ttl=300)
+# Cache de usuários (TTL padrão de 5 minutos)
+# Uma única entrada com a lista e o índice por email: expiram juntos, sem janela em que
+# só um dos dois está no cache. O diretório não depende do usuário logado (banco do Connect
+# ou API com token de serviço), então um único cache por processo atende todas as sessões
+USERS_CACHE_TTL = int(os.getenv('CONNECT_USERS_CACHE_TTL', '300'))
+_users_cache = TTLCache(maxsize=1, ttl=USERS_CACHE_TTL)
+
+# O TTLCache não é thread-safe: leituras/escritas passam por este lock (curto, só o acesso
+# ao dicionário; a busca no Connect usa _users_lock)
+_users_cache_lock = threading.Lock()
+
+# Evita que várias requisições busquem os usuários ao mesmo tempo quando o cache expira
+_users_lock = threading.Lock()
+
+# Limites de espera pelo Connect (banco e API): com o Connect fora do ar a requisição
+# não fica presa no timeout do TCP
+CONNECT_DB_TIMEOUT = int(os.getenv('CONNECT_DB_TIMEOUT', '5'))
+CONNECT_API_TIMEOUT = float(os.getenv('CONNECT_API_TIMEOUT', '10'))
+
+# Após uma falha (banco e API), novas tentativas só depois deste intervalo (segundos);
+# até lá get_users retorna lista vazia sem esperar pelo Connect
+USERS_FAILURE_BACKOFF = int(os.getenv('CONNECT_USERS_FAILURE_BACKOFF', '30'))
+_users_failed_until = 0.0
+
+# Atualização periódica do cache em segundo plano (0 desativa)
+USERS_REFRESH_INTERVAL = int(os.getenv('CONNECT_USERS_REFRESH_INTERVAL', '0'))
+_refresher_started = False
 
 # Cache de token JWT com TTL de 1 hora
 _jwt_token_cache = TTLCache(maxsize=1, ttl=3600)
@@ -34,9 +63,10 @@ class ConnectAPIService:
         Usa cache para evitar gerar tokens desnecessariamente.
         """
         # Verificar cache primeiro
-        if 'token' in _jwt_token_cache:
+        token = _jwt_token_cache.get('token')
+        if token:
             logger.debug("Retornando token JWT do cache")
-            return _jwt_token_cache['token']
+            return token
         
         # Se tiver token fixo configurado, usar ele
         if self.api_token:
@@ -66,7 +96,7 @@ class ConnectAPIService:
             logger.error(f"Erro ao gerar token JWT: {str(e)}", exc_info=True)
             return None
     
-    def get_users(self, request_context=None) -> List[Dict]:
+    def get_users(self, request_context=None, refresh: bool = False) -> List[Dict]:
         """
         Obtém lista de usuários do Connect.
         Tenta primeiro consultar diretamente o banco de dados do Connect.
@@ -75,16 +105,52 @@ class ConnectAPIService:
         
         Args:
             request_context: Contexto da requisição Flask (opcional) para passar cookies de sessão
+            refresh: Ignora o cache e busca a lista novamente no Connect
         """
+        if refresh:
+            self.clear_cache()
+        
+        # Memo por requisição: mesmo com o Connect indisponível (lista vazia não vai
+        # para o cache) a requisição consulta o Connect no máximo uma vez
+        if has_app_context() and 'connect_users' in g:
+            return g.connect_users
+        
+        users = self._get_cached_users(request_context)
+        if has_app_context():
+            g.connect_users = users
+        return users
+    
+    def _get_cached_users(self, request_context=None) -> List[Dict]:
+        """Lista de usuários do cache do processo, buscando-a (uma thread por vez) se expirada"""
+        self._start_refresher()
+        
         # Verificar cache primeiro
-        if 'users' in _users_cache:
-            logger.info("Retornando usuários do cache")
-            return _users_cache['users']
+        entry = self._cached_entry()
+        if entry is not None:
+            logger.debug("Retornando usuários do cache")
+            return entry[0]
+        
+        # Connect falhou há pouco: não esperar por ele de novo a cada requisição
+        if time.monotonic() < _users_failed_until:
+            return []
+        
+        with _users_lock:
+            # Outra thread pode ter preenchido o cache (ou falhado) enquanto esperávamos
+            entry = self._cached_entry()
+            if entry is not None:
+                return entry[0]
+            if time.monotonic() < _users_failed_until:
+                return []
+            return self._fetch_users(request_context)
+    
+    def _fetch_users(self, request_context=None) -> List[Dict]:
+        """Busca usuários no banco do Connect (ou na API) e atualiza o cache"""
+        global _users_failed_until
         
         # Tentar obter do banco de dados do Connect primeiro
         users = self._get_users_from_db()
         if users:
-            _users_cache['users'] = users
+            self._store_users(users)
             logger.info(f"Usuários obtidos do banco de dados do Connect: {len(users)}")
             return users
         
@@ -92,19 +158,87 @@ class ConnectAPIService:
         logger.info("Tentando obter usuários via API HTTP do Connect")
         users = self._get_users_from_api(request_context)
         if users:
-            _users_cache['users'] = users
+            self._store_users(users)
             logger.info(f"Usuários obtidos via API do Connect: {len(users)}")
             return users
         
         logger.error("Não foi possível obter usuários nem do banco nem da API")
+        _users_failed_until = time.monotonic() + USERS_FAILURE_BACKOFF
         return []
     
+    def _start_refresher(self):
+        """
+        Inicia (uma vez por processo) a thread que mantém o cache de usuários aquecido,
+        para que as requisições não esperem pela consulta ao Connect.
+        """
+        global _refresher_started
+        if _refresher_started or USERS_REFRESH_INTERVAL <= 0:
+            return
+        
+        with _users_lock:
+            if _refresher_started:
+                return
+            _refresher_started = True
+        
+        def refresh_loop():
+            while True:
+                time.sleep(USERS_REFRESH_INTERVAL)
+                try:
+                    with _users_lock:
+                        self._fetch_users()
+                except Exception as e:
+                    logger.warning(f"Erro ao atualizar cache de usuários: {str(e)}")
+        
+        threading.Thread(target=refresh_loop, name='connect-users-refresh', daemon=True).start()
+    
+    @staticmethod
+    def _cached_entry():
+        """Entrada (users, users_by_email) do cache, ou None se ausente/expirada"""
+        with _users_cache_lock:
+            return _users_cache.get('users')
+    
+    def _store_users(self, users: List[Dict]):
+        """Grava no cache a lista de usuários e o índice por email"""
+        users_by_email = self._index_by_email(users)
+        with _users_cache_lock:
+            _users_cache['users'] = (users, users_by_email)
+    
+    def get_users_by_email(self, request_context=None) -> Dict[str, Dict]:
+        """
+        Obtém usuários do Connect indexados por email em minúsculas.
+        Usa o mesmo cache de get_users, evitando varrer a lista a cada consulta.
+        """
+        entry = self._cached_entry()
+        if entry is not None:
+            return entry[1]
+        
+        users = self.get_users(request_context)
+        entry = self._cached_entry()
+        if entry is not None:
+            return entry[1]
+        return self._index_by_email(users)
+    
+    @staticmethod
+    def _index_by_email(users: List[Dict]) -> Dict[str, Dict]:
+        """Índice email (minúsculas) -> usuário, montado uma vez por carga da lista"""
+        return {u['email'].lower(): u for u in users if u.get('email')}
+    
+    def get_user_by_email(self, email: str, request_context=None) -> Optional[Dict]:
+        """Obtém um usuário do Connect pelo email, sem diferenciar maiúsculas (consulta O(1) no índice em cache)"""
+        return self.get_users_by_email(request_context).get(email.lower())
+    
+    def get_user_name(self, email: str, request_context=None) -> str:
+        """Obtém o nome do usuário pelo email (retorna o próprio email se não encontrado)"""
+        return self.user_name_from(self.get_users_by_email(request_context), email)
+    
+    @staticmethod
+    def user_name_from(users_by_email: Dict[str, Dict], email: str) -> str:
+        """Nome do usuário a partir de um índice já obtido com get_users_by_email (ou o próprio email)"""
+        return (users_by_email.get(email.lower()) or {}).get('name') or email
+    
     def _get_users_from_db(self) -> List[Dict]:
         """Obtém usuários consultando diretamente o banco de dados do Connect"""
         try:
-            import psycopg2
-            from psycopg2.extras import RealDictCursor
-            
             # Tentar usar as mesmas credenciais do banco atual, mas mudar o database
             # Se tiver DATABASE_URL, tentar extrair e modificar
             database_url = os.getenv('DATABASE_URL')
@@ -132,9 +266,9 @@ class ConnectAPIService:
             
             # Conectar ao banco do Connect
             if connect_db_url:
-                conn = psycopg2.connect(connect_db_url)
+                conn = psycopg2.connect(connect_db_url, connect_timeout=CONNECT_DB_TIMEOUT)
             else:
-                conn = psycopg2.connect(**db_config)
+                conn = psycopg2.connect(**db_config, connect_timeout=CONNECT_DB_TIMEOUT)
             
             try:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -189,7 +323,7 @@ class ConnectAPIService:
                     except Exception as e:
                         logger.warning(f"Não foi possível obter cookies: {str(e)}")
             
-            response = requests.get(url, headers=headers, cookies=cookies, timeout=10)
+            response = requests.get(url, headers=headers, cookies=cookies, timeout=CONNECT_API_TIMEOUT)
             
             if response.status_code == 200:
                 users = response.json()
@@ -204,6 +338,8 @@ class ConnectAPIService:
                     return []
             elif response.status_code == 401:
                 logger.error("Erro de autenticação ao obter usuários do Connect (401 Unauthorized)")
+                # O token em cache pode ter sido invalidado no Connect: gerar outro na próxima tentativa
+                _jwt_token_cache.clear()
                 return []
             else:
                 logger.error(f"Erro ao obter usuários do Connect: {response.status_code} - {response.text}")
@@ -220,8 +356,13 @@ class ConnectAPIService:
             return []
     
     def clear_cache(self):
-        """Limpa o cache de usuários"""
-        _users_cache.clear()
+        """Limpa o cache de usuários (e a espera após falha)"""
+        global _users_failed_until
+        with _users_cache_lock:
+            _users_cache.clear()
+        _users_failed_until = 0.0
+        if has_app_context():
+            g.pop('connect_users', None)
         logger.info("Cache de usuários limpo")
 
 
@@ -2,24 +2,186 @@
 Serviço de Email para Revisões Jurídicas
 """
 
+import io
 import os
+import re
+import atexit
+import time
 import smtplib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
+from email.generator import BytesGenerator
+from email.utils import parseaddr
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app, url_for
 
 logger = logging.getLogger(__name__)
 
+# Envios em segundo plano: a resposta HTTP não espera pelo SMTP
+EMAIL_BACKGROUND_WORKERS = 4
+_email_pool = ThreadPoolExecutor(max_workers=EMAIL_BACKGROUND_WORKERS, thread_name_prefix='email')
+
+# Conexão SMTP: timeout por operação e novas tentativas (com espera crescente) em falhas
+# transitórias; os envios já rodam em segundo plano, então a espera não afeta a resposta
+MAIL_TIMEOUT = float(os.getenv('MAIL_TIMEOUT', '30'))
+MAIL_CONNECT_RETRIES = int(os.getenv('MAIL_CONNECT_RETRIES', '3'))
+MAIL_RETRY_BACKOFF = 2
+
+# Conexões SMTP autenticadas reaproveitadas entre lotes: no máximo uma ociosa por worker,
+# descartadas após SMTP_POOL_MAX_MESSAGES envios ou SMTP_POOL_IDLE_TIMEOUT segundos paradas
+SMTP_POOL_MAX_MESSAGES = 100
+SMTP_POOL_IDLE_TIMEOUT = int(os.getenv('MAIL_POOL_IDLE_TIMEOUT', '60'))
+
+
+def _close_smtp(server) -> None:
+    """Encerra a conexão SMTP ignorando erros (servidor pode já ter fechado)"""
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+def _send_smtp_message(server, message) -> None:
+    """
+    Envia a mensagem pela conexão. Se o servidor anunciar PIPELINING (RFC 2920),
+    MAIL FROM, RCPT TO e DATA seguem juntos e as respostas são lidas depois,
+    em uma ida e volta em vez de três.
+    Endereços fora do ASCII exigem SMTPUTF8, tratado pelo próprio send_message.
+    """
+    from_addr = parseaddr(message['From'])[1]
+    to_addr = parseaddr(message['To'])[1]
+    if not server.has_extn('pipelining') or not (from_addr.isascii() and to_addr.isascii()):
+        server.send_message(message)
+        return
+    
+    buffer = io.BytesIO()
+    BytesGenerator(buffer, policy=message.policy.clone(linesep='\r\n')).flatten(message, linesep='\r\n')
+    data = re.sub(br'(?m)^\.', b'..', buffer.getvalue())
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    
+    server.send(f"MAIL FROM:<{from_addr}>\r\nRCPT TO:<{to_addr}>\r\nDATA\r\n")
+    (mail_code, mail_reply), (rcpt_code, rcpt_reply), (data_code, data_reply) = (
+        server.getreply(), server.getreply(), server.getreply()
+    )
+    
+    if mail_code != 250 or rcpt_code not in (250, 251) or data_code != 354:
+        if data_code == 354:
+            # Servidor aceitou DATA mesmo sem remetente/destinatário válido: encerrar vazio
+            server.send(b'.\r\n')
+            server.getreply()
+        server.rset()
+        if mail_code != 250:
+            raise smtplib.SMTPSenderRefused(mail_code, mail_reply, from_addr)
+        if rcpt_code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({to_addr: (rcpt_code, rcpt_reply)})
+        raise smtplib.SMTPDataError(data_code, data_reply)
+    
+    server.send(data + b'.\r\n')
+    code, reply = server.getreply()
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, reply)
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexões SMTP já autenticadas, compartilhado pelos envios em segundo plano.
+    Evita refazer conexão, STARTTLS e login a cada lote de emails.
+    """
+    
+    def __init__(self, max_idle: int, max_messages: int, idle_timeout: int):
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (server, mensagens enviadas, instante da devolução)
+        self._lock = threading.Lock()
+    
+    def acquire(self, connect):
+        """
+        Retorna (server, mensagens já enviadas): uma conexão ociosa que responda ao NOOP
+        ou uma nova, aberta com connect(). server é None se não for possível conectar.
+        """
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                break
+            
+            server, sent_count, released_at = entry
+            if time.monotonic() - released_at > self.idle_timeout:
+                _close_smtp(server)
+                continue
+            try:
+                if server.noop()[0] == 250:
+                    return server, sent_count
+            except Exception:
+                pass
+            _close_smtp(server)
+        
+        return connect(), 0
+    
+    def release(self, server, sent_count: int) -> None:
+        """Devolve a conexão ao pool (ou a encerra, se já enviou demais ou o pool está cheio)"""
+        if sent_count < self.max_messages:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append((server, sent_count, time.monotonic()))
+                    return
+        _close_smtp(server)
+    
+    def close_all(self) -> None:
+        """Encerra as conexões ociosas"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _, _ in idle:
+            _close_smtp(server)
+
+
+_smtp_pool = SMTPConnectionPool(EMAIL_BACKGROUND_WORKERS, SMTP_POOL_MAX_MESSAGES, SMTP_POOL_IDLE_TIMEOUT)
+atexit.register(_smtp_pool.close_all)
+
+# Campos da revisão usados pelos templates de email
+REVIEW_EMAIL_FIELDS = ('id', 'title', 'description', 'version', 'reviewer_name', 'review_date')
+
 
 class EmailService:
     """Serviço para envio de emails"""
     
     def __init__(self):
-        self.email_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'emails')
+        self.email_dir = str(Path(__file__).resolve().parents[2] / 'emails')
         os.makedirs(self.email_dir, exist_ok=True)
     
+    def send_in_background(self, func, *args, **kwargs):
+        """
+        Agenda um envio no pool de emails e retorna imediatamente.
+        
+        Os dados (destinatários, URLs, review) devem ser montados antes, ainda no
+        request; falhas no envio ficam apenas registradas no log.
+        """
+        def run():
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Erro ao enviar email em segundo plano: {str(e)}", exc_info=True)
+        
+        return _email_pool.submit(run)
+    
+    @staticmethod
+    def review_snapshot(review: dict) -> dict:
+        """
+        Cópia enxuta da revisão com apenas os campos usados nos emails, para a tarefa
+        em segundo plano não reter a linha completa (históricos, viewers etc.)
+        """
+        return {field: review[field] for field in REVIEW_EMAIL_FIELDS if field in review}
+    
     def send_approval_request_email(self, approver_email: str, approver_name: str, 
                                    review_data: dict, approval_url: str) -> bool:
         """Envia email de solicitação de aprovação"""
@@ -30,6 +192,21 @@ class EmailService:
         
         return self._send_email(approver_email, subject, html_content)
     
+    def approval_request_messages(self, approvers: list, review_data: dict) -> list:
+        """
+        Monta os emails de solicitação de aprovação, no formato de send_batch.
+        
+        Args:
+            approvers: Lista de tuplas (approver_email, approver_name, approval_url)
+            review_data: Dados da revisão
+        """
+        subject = f"Revisão Jurídica Pendente de Aprovação - {review_data.get('title', 'Documento')}"
+        return [
+            (approver_email, subject,
+             self._get_approval_request_template(approver_name, review_data, approval_url))
+            for approver_email, approver_name, approval_url in approvers
+        ]
+    
     def send_approval_confirmation_email(self, reviewer_email: str, reviewer_name: str,
                                         approver_name: str, review_data: dict, 
                                         status: str, comments: str) -> bool:
@@ -154,24 +331,48 @@ class EmailService:
     def send_new_document_email(self, viewer_email: str, viewer_name: str,
                                review_data: dict, review_url: str) -> bool:
         """Envia email para visualizador informando novo documento criado"""
-        subject = f"Novo Documento Criado - {review_data.get('title', 'Documento')} - V{review_data.get('version', '1')}"
-        html_content = self._get_new_document_template(
-            viewer_name, review_data, review_url
-        )
-        
+        subject, html_content = self._new_document_content(viewer_name, review_data, review_url)
         return self._send_email(viewer_email, subject, html_content)
     
     def send_new_version_email(self, viewer_email: str, viewer_name: str,
                               review_data: dict, review_url: str, 
                               previous_version: int = None) -> bool:
         """Envia email para visualizador informando nova versão do documento"""
+        subject, html_content = self._new_version_content(
+            viewer_name, review_data, review_url, previous_version
+        )
+        return self._send_email(viewer_email, subject, html_content)
+    
+    def _new_document_content(self, viewer_name: str, review_data: dict, review_url: str) -> tuple:
+        """Assunto e HTML do email de novo documento"""
+        subject = f"Novo Documento Criado - {review_data.get('title', 'Documento')} - V{review_data.get('version', '1')}"
+        return subject, self._get_new_document_template(viewer_name, review_data, review_url)
+    
+    def _new_version_content(self, viewer_name: str, review_data: dict, review_url: str,
+                             previous_version: int = None) -> tuple:
+        """Assunto e HTML do email de nova versão"""
         current_version = review_data.get('version', 'N/A')
         subject = f"Nova Versão de Documento - {review_data.get('title', 'Documento')} - V{current_version}"
-        html_content = self._get_new_version_template(
+        return subject, self._get_new_version_template(
             viewer_name, review_data, review_url, previous_version
         )
-        
-        return self._send_email(viewer_email, subject, html_content)
+    
+    def viewer_messages(self, viewer_emails: list, review_data: dict, review_url: str,
+                        is_new_document: bool = True, previous_version: int = None) -> list:
+        """Monta os emails de novo documento/nova versão para os visualizadores, no formato de send_batch"""
+        messages = []
+        for viewer_email in viewer_emails:
+            # Extrair nome do visualizador (se disponível no review_data)
+            viewer_name = viewer_email.split('@')[0].title()
+            
+            if is_new_document:
+                content = self._new_document_content(viewer_name, review_data, review_url)
+            else:
+                content = self._new_version_content(
+                    viewer_name, review_data, review_url, previous_version
+                )
+            messages.append((viewer_email, *content))
+        return messages
     
     def send_emails_to_viewers(self, viewer_emails: list, review_data: dict,
                               review_url: str, is_new_document: bool = True,
@@ -189,34 +390,13 @@ class EmailService:
         Returns:
             Dict com listas de e-mails enviados e falhados: {'sent': [...], 'failed': [...]}
         """
-        sent = []
-        failed = []
-        
-        for viewer_email in viewer_emails:
-            try:
-                # Extrair nome do visualizador (se disponível no review_data)
-                viewer_name = viewer_email.split('@')[0].title()
-                
-                if is_new_document:
-                    success = self.send_new_document_email(
-                        viewer_email, viewer_name, review_data, review_url
-                    )
-                else:
-                    success = self.send_new_version_email(
-                        viewer_email, viewer_name, review_data, review_url, previous_version
-                    )
-                
-                if success:
-                    sent.append(viewer_email)
-                    logger.info(f"Email enviado para visualizador: {viewer_email}")
-                else:
-                    failed.append(viewer_email)
-                    logger.warning(f"Falha ao enviar email para visualizador: {viewer_email}")
-            except Exception as e:
-                failed.append(viewer_email)
-                logger.error(f"Erro ao enviar email para visualizador {viewer_email}: {str(e)}", exc_info=True)
-        
-        return {'sent': sent, 'failed': failed}
+        result = self._send_emails(self.viewer_messages(
+            viewer_emails, review_data, review_url, is_new_document, previous_version
+        ))
+        logger.info(f"E-mails enviados para {len(result['sent'])} visualizador(es)")
+        if result['failed']:
+            logger.warning(f"Falha ao enviar para {len(result['failed'])} visualizador(es): {result['failed']}")
+        return result
     
     def _get_new_document_template(self, viewer_name: str, review_data: dict, review_url: str) -> str:
         """Template HTML para email de novo documento"""
@@ -333,49 +513,134 @@ class EmailService:
         """
     
     def _send_email(self, to_email: str, subject: str, html_content: str) -> bool:
-        """Envia email via SMTP ou salva em arquivo"""
+        """Envia email via SMTP (conexão do pool) ou salva em arquivo"""
         try:
-            # Tentar enviar via SMTP
-            if self._try_smtp_send(to_email, subject, html_content):
-                return True
-            
-            # Fallback: salvar em arquivo
-            return self._save_email_to_file(to_email, subject, html_content)
+            return bool(self._send_emails([(to_email, subject, html_content)])['sent'])
         except Exception as e:
             logger.error(f"Erro ao enviar email: {str(e)}")
             return False
     
-    def _try_smtp_send(self, to_email: str, subject: str, html_content: str) -> bool:
-        """Tenta enviar email via SMTP"""
+    def send_batch(self, messages: list) -> dict:
+        """
+        Envia emails de tipos diferentes (aprovadores, confirmação, visualizadores)
+        em uma única sessão SMTP.
+        
+        Args:
+            messages: Lista de tuplas (to_email, subject, html_content)
+        """
+        result = self._send_emails(messages)
+        logger.info(f"Lote de e-mails: {len(result['sent'])} enviado(s)")
+        if result['failed']:
+            logger.warning(f"Falha ao enviar para: {result['failed']}")
+        return result
+    
+    def _send_emails(self, messages: list) -> dict:
+        """
+        Envia vários emails reaproveitando uma única conexão SMTP (obtida do pool).
+        
+        Sem SMTP configurado (ou se a conexão falhar) cada email é salvo em arquivo,
+        como em _send_email.
+        
+        Args:
+            messages: Lista de tuplas (to_email, subject, html_content)
+        
+        Returns:
+            Dict com listas de e-mails enviados e falhados: {'sent': [...], 'failed': [...]}
+        """
+        sent = []
+        failed = []
+        
+        if not messages:
+            return {'sent': sent, 'failed': failed}
+        
+        server, sent_count = _smtp_pool.acquire(self._connect_smtp)
+        
+        try:
+            for to_email, subject, html_content in messages:
+                if server is not None:
+                    message = self._build_message(to_email, subject, html_content)
+                    try:
+                        try:
+                            _send_smtp_message(server, message)
+                        except smtplib.SMTPServerDisconnected:
+                            # Servidor encerrou a sessão no meio do lote: reconectar e reenviar
+                            logger.warning("Conexão SMTP encerrada pelo servidor, reconectando")
+                            _close_smtp(server)
+                            server, sent_count = self._connect_smtp(), 0
+                            if server is None:
+                                raise
+                            _send_smtp_message(server, message)
+                        sent_count += 1
+                        logger.info(f"Email enviado via SMTP para: {to_email}")
+                        sent.append(to_email)
+                        continue
+                    except Exception as e:
+                        logger.warning(f"Falha ao enviar email via SMTP: {str(e)}")
+                
+                # Fallback: salvar em arquivo
+                if self._save_email_to_file(to_email, subject, html_content):
+                    sent.append(to_email)
+                else:
+                    failed.append(to_email)
+        finally:
+            if server is not None:
+                _smtp_pool.release(server, sent_count)
+        
+        return {'sent': sent, 'failed': failed}
+    
+    def _open_smtp(self):
+        """
+        Abre e autentica uma conexão SMTP com as configurações do ambiente.
+        Retorna None se o SMTP não estiver configurado.
+        """
+        mail_server = os.getenv('MAIL_SERVER')
+        mail_port = int(os.getenv('MAIL_PORT', 587))
+        mail_username = os.getenv('MAIL_USERNAME')
+        mail_password = os.getenv('MAIL_PASSWORD')
+        mail_use_tls = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
+        
+        if not mail_server or not mail_username:
+            return None
+        
+        server = smtplib.SMTP(mail_server, mail_port, timeout=MAIL_TIMEOUT)
         try:
-            mail_server = os.getenv('MAIL_SERVER')
-            mail_port = int(os.getenv('MAIL_PORT', 587))
-            mail_username = os.getenv('MAIL_USERNAME')
-            mail_password = os.getenv('MAIL_PASSWORD')
-            mail_use_tls = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
-            
-            if not mail_server or not mail_username:
-                return False
-            
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = mail_username
-            msg['To'] = to_email
-            
-            msg.attach(MIMEText(html_content, 'html'))
-            
-            server = smtplib.SMTP(mail_server, mail_port)
             if mail_use_tls:
                 server.starttls()
             server.login(mail_username, mail_password)
-            server.send_message(msg)
-            server.quit()
-            
-            logger.info(f"Email enviado via SMTP para: {to_email}")
-            return True
-        except Exception as e:
-            logger.warning(f"Falha ao enviar email via SMTP: {str(e)}")
-            return False
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    def _connect_smtp(self):
+        """
+        Abre a conexão SMTP tentando novamente (MAIL_CONNECT_RETRIES) em falhas transitórias.
+        Retorna None se o SMTP não estiver configurado ou não responder.
+        """
+        for attempt in range(MAIL_CONNECT_RETRIES + 1):
+            try:
+                return self._open_smtp()
+            except smtplib.SMTPAuthenticationError as e:
+                # Credencial inválida não se resolve tentando de novo
+                logger.warning(f"Falha de autenticação no servidor SMTP: {str(e)}")
+                return None
+            except (OSError, smtplib.SMTPException) as e:
+                if attempt == MAIL_CONNECT_RETRIES:
+                    logger.warning(f"Falha ao conectar ao servidor SMTP: {str(e)}")
+                    return None
+                delay = MAIL_RETRY_BACKOFF * (2 ** attempt)
+                logger.info(f"Falha ao conectar ao servidor SMTP ({str(e)}), nova tentativa em {delay}s")
+                time.sleep(delay)
+        return None
+    
+    def _build_message(self, to_email: str, subject: str, html_content: str) -> MIMEMultipart:
+        """Monta a mensagem MIME (HTML) de um email"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = os.getenv('MAIL_USERNAME')
+        msg['To'] = to_email
+        msg.attach(MIMEText(html_content, 'html'))
+        return msg
     
     def _save_email_to_file(self, to_email: str, subject: str, html_content: str) -> bool:
         """Salva email em arquivo para desenvolvimento"""
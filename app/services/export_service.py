@@ -3,18 +3,24 @@ Serviço para exportação de revisões em PDF/DOCX
 """
 
 import os
+import json
+import hashlib
 import logging
-from typing import Dict
+import tempfile
+from typing import Callable, Dict, Optional
 from flask import render_template_string
 
 logger = logging.getLogger(__name__)
 
+# Incrementar quando o layout das exportações mudar, para invalidar o cache em disco
+EXPORT_CACHE_VERSION = 1
+
 
 class ExportService:
     """Serviço para exportar revisões em diferentes formatos"""
     
-    def export_to_pdf(self, review_data: Dict) -> bytes:
-        """Exporta revisão para PDF"""
+    def export_to_pdf(self, review_data: Dict, out=None) -> Optional[bytes]:
+        """Exporta revisão para PDF (em `out`, se informado; senão retorna os bytes)"""
         try:
             from reportlab.lib.pagesizes import letter, A4
             from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -23,7 +29,8 @@ class ExportService:
             from reportlab.lib import colors
             from io import BytesIO
             
-            buffer = BytesIO()
+            # Escreve direto no destino (ex: arquivo temporário da resposta)
+            buffer = out if out is not None else BytesIO()
             doc = SimpleDocTemplate(buffer, pagesize=A4)
             story = []
             styles = getSampleStyleSheet()
@@ -85,15 +92,16 @@ class ExportService:
                     story.append(Spacer(1, 0.1*inch))
             
             doc.build(story)
-            buffer.seek(0)
+            if out is not None:
+                return None
             return buffer.getvalue()
         except Exception as e:
             logger.error(f"Erro ao exportar para PDF: {str(e)}")
             raise
     
     def export_to_pdf_with_history(self, review_data: Dict, versions_with_comments: list, 
-                                   versions_with_risks: list) -> bytes:
-        """Exporta revisão para PDF incluindo histórico completo"""
+                                   versions_with_risks: list, out=None) -> Optional[bytes]:
+        """Exporta revisão para PDF incluindo histórico completo (em `out`, se informado)"""
         try:
             from reportlab.lib.pagesizes import letter, A4
             from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -102,7 +110,8 @@ class ExportService:
             from reportlab.lib import colors
             from io import BytesIO
             
-            buffer = BytesIO()
+            # Escreve direto no destino (ex: arquivo temporário da resposta)
+            buffer = out if out is not None else BytesIO()
             doc = SimpleDocTemplate(buffer, pagesize=A4)
             story = []
             styles = getSampleStyleSheet()
@@ -190,14 +199,15 @@ class ExportService:
                 story.append(Paragraph(review_data.get('observations', ''), styles['Normal']))
             
             doc.build(story)
-            buffer.seek(0)
+            if out is not None:
+                return None
             return buffer.getvalue()
         except Exception as e:
             logger.error(f"Erro ao exportar para PDF com histórico: {str(e)}")
             raise
     
-    def export_to_docx(self, review_data: Dict) -> bytes:
-        """Exporta revisão para DOCX"""
+    def export_to_docx(self, review_data: Dict, out=None) -> Optional[bytes]:
+        """Exporta revisão para DOCX (em `out`, se informado; senão retorna os bytes)"""
         try:
             from docx import Document
             from docx.shared import Inches, Pt
@@ -255,18 +265,20 @@ class ExportService:
                     doc.add_paragraph(f"Data: {approved_at}")
                     doc.add_paragraph(f"Comentário: {approval.get('comments', 'N/A')}")
             
-            # Salvar em buffer
+            # Salvar direto no destino, se informado
+            if out is not None:
+                doc.save(out)
+                return None
             buffer = BytesIO()
             doc.save(buffer)
-            buffer.seek(0)
             return buffer.getvalue()
         except Exception as e:
             logger.error(f"Erro ao exportar para DOCX: {str(e)}")
             raise
     
     def export_to_docx_with_history(self, review_data: Dict, versions_with_comments: list,
-                                    versions_with_risks: list) -> bytes:
-        """Exporta revisão para DOCX incluindo histórico completo"""
+                                    versions_with_risks: list, out=None) -> Optional[bytes]:
+        """Exporta revisão para DOCX incluindo histórico completo (em `out`, se informado)"""
         try:
             from docx import Document
             from docx.shared import Inches, Pt
@@ -343,15 +355,90 @@ class ExportService:
                 doc.add_heading('Observações Gerais (Versão Atual)', 1)
                 doc.add_paragraph(review_data.get('observations', ''))
             
-            # Salvar em buffer
+            # Salvar direto no destino, se informado
+            if out is not None:
+                doc.save(out)
+                return None
             buffer = BytesIO()
             doc.save(buffer)
-            buffer.seek(0)
             return buffer.getvalue()
         except Exception as e:
             logger.error(f"Erro ao exportar para DOCX com histórico: {str(e)}")
             raise
 
+    
+    def export_digest(self, source_data) -> str:
+        """Hash curto dos dados de uma exportação (chave do cache e ETag do download)"""
+        payload = json.dumps(source_data, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:16]
+    
+    def get_cached_export(self, cache_dir: str, name: str, source_data, writer: Callable,
+                          digest: Optional[str] = None) -> str:
+        """
+        Retorna o caminho de uma exportação em cache, gerando-a se necessário.
+        
+        A chave inclui um hash dos dados usados na exportação (revisão, aprovações,
+        históricos), então qualquer alteração gera um novo arquivo. Ao gravar uma
+        nova entrada, as anteriores com o mesmo nome são removidas.
+        
+        Args:
+            cache_dir: Diretório do cache
+            name: Prefixo do arquivo (ex: revisao_10_v3_historico.pdf)
+            source_data: Dados que alimentam a exportação (serializáveis em JSON)
+            writer: Função que recebe um arquivo aberto e escreve a exportação
+            digest: Hash de source_data já calculado com export_digest (opcional)
+        
+        Returns:
+            Caminho do arquivo exportado
+        """
+        digest = digest or self.export_digest(source_data)
+        base, ext = os.path.splitext(name)
+        prefix = f"{base}_c{EXPORT_CACHE_VERSION}_"
+        path = os.path.join(cache_dir, f"{prefix}{digest}{ext}")
+        
+        if os.path.exists(path):
+            return path
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        # Escrita atômica: arquivo temporário no mesmo diretório + rename
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                writer(tmp_file)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        # Remover versões anteriores da mesma exportação
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(prefix) and entry.endswith(ext) and os.path.join(cache_dir, entry) != path:
+                try:
+                    os.remove(os.path.join(cache_dir, entry))
+                except OSError:
+                    pass
+        
+        return path
+    
+    def invalidate_exports(self, cache_dir: str, review_ids) -> None:
+        """Remove do cache as exportações das revisões informadas (todas as versões/formatos)"""
+        if not cache_dir or not os.path.isdir(cache_dir):
+            return
+        
+        prefixes = tuple(f"revisao_{review_id}_v" for review_id in review_ids)
+        if not prefixes:
+            return
+        
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(prefixes):
+                try:
+                    os.remove(os.path.join(cache_dir, entry))
+                except OSError:
+                    pass
 
 # Instância global do serviço
 export_service = ExportService()
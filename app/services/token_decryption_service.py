@@ -6,6 +6,7 @@ import os
 import json
 import base64
 import logging
+import threading
 from datetime import datetime
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -17,8 +18,9 @@ logger = logging.getLogger(__name__)
 
 # Carregar variáveis de ambiente
 _env_path = Path(__file__).resolve().parents[2] / 'config.env'
-if _env_path.exists():
+if not os.environ.get('_DOTENV_LOADED') and _env_path.exists():
     load_dotenv(dotenv_path=_env_path, override=True)
+    os.environ['_DOTENV_LOADED'] = '1'
 
 
 class TokenDecryptionService:
@@ -35,11 +37,28 @@ class TokenDecryptionService:
         if len(self.secret_key) < 32:
             raise ValueError("CONNECT_SECRET_KEY deve ter pelo menos 32 caracteres")
         
-        # Gerar chave de criptografia a partir da secret key
-        self._fernet = self._create_fernet()
+        # A chave Fernet (PBKDF2 com 100k iterações) é derivada apenas no primeiro uso,
+        # para não pesar na importação/cold start dos workers
+        self._fernet_instance = None
+        self._fernet_lock = threading.Lock()
+    
+    @property
+    def _fernet(self) -> Fernet:
+        """Instância Fernet derivada sob demanda (uma única vez por processo)"""
+        if self._fernet_instance is None:
+            with self._fernet_lock:
+                if self._fernet_instance is None:
+                    self._fernet_instance = self._create_fernet()
+        return self._fernet_instance
     
     def _create_fernet(self):
-        """Cria instância Fernet para descriptografia"""
+        """
+        Cria instância Fernet para descriptografia.
+        
+        Fernet (AES-128-CBC + HMAC-SHA256) do pacote cryptography roda sobre o
+        OpenSSL (EVP), que já usa AES-NI quando disponível. O formato do token é
+        definido pelo Connect, então o algoritmo não pode ser trocado só deste lado.
+        """
         # Usar a secret key como salt para gerar chave de descriptografia
         salt = self.secret_key.encode()[:16]  # Primeiros 16 bytes como salt
         
@@ -0,0 +1,22 @@
+"""
+Utilitários para respostas de download (anexos entregues pelo servidor web via X-Accel-Redirect)
+"""
+
+import unicodedata
+from urllib.parse import quote
+from flask import Response
+
+
+def set_attachment_filename(response: Response, filename: str) -> None:
+    """
+    Content-Disposition de anexo como o send_file monta: aspas escapadas e, para nomes
+    fora do ASCII, um nome ASCII aproximado mais o nome original em filename* (UTF-8)
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        options = {'filename': simple_name, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"}
+    else:
+        options = {'filename': filename}
+    response.headers.set('Content-Disposition', 'attachment', **options)
@@ -4,13 +4,74 @@ Utilitários para upload de arquivos
 
 import os
 import uuid
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import magic
 from werkzeug.utils import secure_filename
-from flask import current_app
+from flask import Request, current_app, has_app_context
+from app.repositories.review_documents_repository import create_document_reference
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Uploads acima deste tamanho total vão direto para um arquivo em UPLOAD_FOLDER
+UPLOAD_SPOOL_MAX_SIZE = 500 * 1024
+# Subpasta (mesmo sistema de arquivos dos anexos) dos uploads ainda em recebimento
+UPLOAD_INCOMING_DIR = '.incoming'
+
+
+class UploadRequest(Request):
+    """
+    Request que grava os arquivos grandes do multipart em um arquivo temporário
+    dentro de UPLOAD_FOLDER, em vez do /tmp. Assim save_uploaded_file pode
+    publicar o arquivo com um hard link, sem copiar os bytes novamente.
+    Os campos de texto ficam limitados a MAX_FORM_MEMORY_SIZE (413 acima disso).
+    """
+    
+    @property
+    def max_form_memory_size(self):
+        if has_app_context():
+            return current_app.config.get('MAX_FORM_MEMORY_SIZE')
+        return None
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload_folder = current_app.config.get('UPLOAD_FOLDER') if has_app_context() else None
+        if upload_folder and filename and (total_content_length or 0) > UPLOAD_SPOOL_MAX_SIZE:
+            incoming_dir = os.path.join(upload_folder, UPLOAD_INCOMING_DIR)
+            try:
+                os.makedirs(incoming_dir, exist_ok=True)
+                return tempfile.NamedTemporaryFile('wb+', dir=incoming_dir, prefix='upload-', suffix='.part')
+            except OSError as e:
+                logger.warning(f"Não foi possível criar arquivo temporário em {incoming_dir}: {str(e)}")
+        
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def _link_incoming_file(file, file_path: str) -> bool:
+    """
+    Publica o upload recebido em UPLOAD_FOLDER/.incoming com um hard link no destino final.
+    Retorna False se o upload não estiver lá (arquivo pequeno em memória, outro disco etc.).
+    """
+    incoming_path = getattr(file.stream, 'name', None)
+    if not isinstance(incoming_path, str):
+        return False
+    
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    if os.path.dirname(incoming_path) != os.path.join(upload_folder, UPLOAD_INCOMING_DIR):
+        return False
+    
+    try:
+        file.stream.flush()
+        os.link(incoming_path, file_path)
+        # O temporário é criado com 0600; o anexo deve ter as mesmas permissões de um file.save
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(file_path, 0o666 & ~umask)
+        return True
+    except OSError as e:
+        logger.warning(f"Não foi possível criar link do upload, copiando: {str(e)}")
+        return False
+
 
 def validate_file(file) -> bool:
     """
@@ -85,14 +146,15 @@ def save_uploaded_file(file, review_id: int, uploaded_by: str) -> dict:
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
     file_path = os.path.join(review_folder, unique_filename)
     
-    # Salvar arquivo
-    file.save(file_path)
+    # Uploads grandes já estão gravados em UPLOAD_FOLDER (UploadRequest): basta um hard link.
+    # Nos demais casos copiar em blocos maiores reduz o número de leituras/escritas
+    if not _link_incoming_file(file, file_path):
+        file.save(file_path, buffer_size=current_app.config.get('UPLOAD_COPY_BUFFER_SIZE', 16384))
     
     # Obter tamanho
     file_size = os.path.getsize(file_path)
     
     # Salvar referência no banco
-    from app.repositories.review_documents_repository import create_document_reference
     doc_id = create_document_reference(
         review_id, original_filename, file_path, file_size, uploaded_by
     )
@@ -104,3 +166,27 @@ def save_uploaded_file(file, review_id: int, uploaded_by: str) -> dict:
         'file_size': file_size
     }
 
+
+def delete_files(file_paths: list, max_workers: int = 8) -> list:
+    """
+    Remove arquivos do servidor em paralelo (I/O de disco independente).
+    Arquivos inexistentes são ignorados.
+    
+    Returns:
+        Lista de caminhos que não puderam ser removidos
+    """
+    if not file_paths:
+        return []
+    
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Não foi possível excluir o arquivo {path}: {str(e)}")
+            return path
+        return None
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        return [path for path in executor.map(remove, file_paths) if path]
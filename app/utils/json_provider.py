@@ -0,0 +1,32 @@
+"""
+Provedor JSON do Flask baseado em orjson (respostas de jsonify mais rápidas)
+"""
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Serializa as respostas com orjson (UTF-8 direto, sem ensure_ascii).
+    Em debug (saída indentada) ou com opções do json padrão, usa o provedor padrão.
+    Diferente do padrão, datetime sai em ISO 8601 (suporte nativo do orjson).
+    """
+    
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode('utf-8')
+    
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+    
+    def _dumps_bytes(self, obj) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
@@ -0,0 +1,44 @@
+"""
+Utilitários para montar URLs absolutas do sistema de revisões (links em e-mails e retorno do Connect)
+"""
+
+import os
+from typing import Optional
+from flask import current_app, request, url_for
+
+
+def resolve_reviews_base_url(app) -> Optional[str]:
+    """
+    Resolve a URL base configurada do sistema de revisões (não do Connect).
+    Prioridade: variável de ambiente REVIEWS_BASE_URL > SERVER_NAME configurado.
+    Retorna None quando nenhuma está definida (usa-se então o host da requisição).
+    """
+    reviews_base_url = os.getenv('REVIEWS_BASE_URL')
+    if reviews_base_url:
+        return reviews_base_url.rstrip('/')
+    
+    server_name = app.config.get('SERVER_NAME')
+    if server_name:
+        preferred_scheme = app.config.get('PREFERRED_URL_SCHEME', 'http')
+        return f"{preferred_scheme}://{server_name}"
+    
+    return None
+
+
+def get_reviews_base_url() -> str:
+    """URL base do sistema de revisões, resolvida no create_app ou pelo host da requisição"""
+    reviews_base_url = current_app.config.get('RESOLVED_REVIEWS_BASE_URL')
+    if reviews_base_url:
+        return reviews_base_url
+    
+    # Fallback: host da requisição atual, garantindo que não é a URL do Connect
+    # (porta 5001 do Connect vira a porta padrão de revisões, 5002)
+    host_url = request.host_url.rstrip('/')
+    if ':5001' in host_url:
+        return host_url.replace(':5001', ':5002')
+    return host_url
+
+
+def external_url(endpoint: str, **values) -> str:
+    """URL absoluta de uma rota do sistema de revisões"""
+    return f"{get_reviews_base_url()}{url_for(endpoint, **values)}"
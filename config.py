@@ -8,8 +8,9 @@ from dotenv import load_dotenv
 
 # Carregar config.env antes de definir a classe Config
 _env_path = Path(__file__).resolve().parent / 'config.env'
-if _env_path.exists():
+if not os.environ.get('_DOTENV_LOADED') and _env_path.exists():
     load_dotenv(dotenv_path=_env_path, override=True)
+    os.environ['_DOTENV_LOADED'] = '1'
 
 class Config:
     """Configuração base"""
@@ -29,6 +30,12 @@ class Config:
     SESSION_COOKIE_SAMESITE = os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
     PERMANENT_SESSION_LIFETIME = 86400  # 24 horas em segundos
     SESSION_REFRESH_EACH_REQUEST = True
+    # Sessão no servidor (Flask-Session + Redis); vazio mantém o cookie assinado padrão
+    REDIS_URL = os.environ.get('REDIS_URL')
+    
+    # Cache (segundos) das consultas do dashboard e das aprovações pendentes; 0 desativa.
+    # Só é usado com REDIS_URL (compartilhado e invalidado em todos os workers)
+    QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', 30))
     
     # Configurações do Banco de Dados
     DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -59,9 +66,26 @@ class Config:
     
     # Upload de arquivos
     MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'reviews')
+    # Limite do corpo da requisição: o Werkzeug recusa (413) antes de processar o multipart
+    MAX_CONTENT_LENGTH = int(os.environ['MAX_CONTENT_LENGTH']) if os.environ.get('MAX_CONTENT_LENGTH') else None
+    # Limite dos campos de texto do multipart em memória (arquivos vão para disco e não contam)
+    MAX_FORM_MEMORY_SIZE = int(os.environ.get('MAX_FORM_MEMORY_SIZE', 1024 * 1024))
+    # Buffer de cópia do upload temporário para o destino final
+    UPLOAD_COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+    
+    # Cache em disco das exportações PDF/DOCX (vazio desativa)
+    EXPORT_CACHE_DIR = os.environ.get(
+        'EXPORT_CACHE_DIR', str(Path(__file__).resolve().parent / 'instance' / 'exports')
+    )
+    UPLOAD_FOLDER = str(Path(__file__).resolve().parent / 'static' / 'uploads' / 'reviews')
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'rtf'}
     DANGEROUS_EXTENSIONS = {'exe', 'bat', 'cmd', 'com', 'scr', 'vbs', 'js', 'jar', 'dll', 'msi', 'ps1', 'sh'}
+    
+    # Entrega de arquivos pelo servidor web (Apache: X-Sendfile / nginx: X-Accel-Redirect)
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+    # nginx: location interna que aponta para EXPORT_CACHE_DIR
+    EXPORT_X_ACCEL_PREFIX = os.environ.get('EXPORT_X_ACCEL_PREFIX')
 
 class DevelopmentConfig(Config):
     """Configuração de desenvolvimento"""
@@ -0,0 +1,15 @@
+-- ========================================
+-- REVISÕES JURÍDICAS - Índice de aprovações pendentes por aprovador
+-- ========================================
+-- Busca da aprovação pendente do aprovador (tela de aprovação e aprovar/rejeitar)
+-- compara o email sem diferenciar maiúsculas: LOWER(approver_email) = LOWER(...).
+-- O índice em approver_email não atende essa comparação; este índice funcional
+-- parcial cobre só as aprovações pendentes (pequeno mesmo com o histórico crescendo).
+--
+-- CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação:
+-- execute este script sem BEGIN/COMMIT (no pgAdmin, com auto-commit ligado).
+-- ========================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_review_approvals_pending_email_lower
+ON revisoes_juridicas.review_approvals (review_id, LOWER(approver_email))
+WHERE status = 'pending';
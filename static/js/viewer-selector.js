@@ -0,0 +1,144 @@
+/**
+ * REVISÕES JURÍDICAS - Seleção de visualizadores
+ * Carrega a lista de usuários do Connect (users.json) nas telas de
+ * visualizadores e filtra a lista pela busca
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const searchInput = document.getElementById('userSearch');
+    const clearBtn = document.getElementById('clearSearch');
+    const userList = document.getElementById('userList');
+    const userCounter = document.getElementById('userCounter');
+    const noResults = document.getElementById('noResults');
+    // Com data-require-list (gerenciar visualizadores, que substitui a lista), Salvar só fica
+    // disponível com a lista carregada: sem os checkboxes o formulário iria sem viewers[]
+    // e a revisão ficaria só com o usuário atual
+    const requireList = userList.hasAttribute('data-require-list');
+    const submitBtn = userList.closest('form').querySelector('button[type="submit"]');
+    const selectedEmails = new Set(JSON.parse(userList.getAttribute('data-selected') || '[]'));
+    let userItems = [];
+    let totalUsers = 0;
+    
+    // Lista de usuários carregada do Connect depois da renderização da página
+    function renderUsers(users) {
+        users.forEach((user, index) => {
+            const item = document.createElement('div');
+            item.className = 'form-check user-item';
+            item.setAttribute('data-user-name', (user.name || '').toLowerCase());
+            item.setAttribute('data-user-email', user.email.toLowerCase());
+            
+            const checkbox = document.createElement('input');
+            checkbox.className = 'form-check-input';
+            checkbox.type = 'checkbox';
+            checkbox.name = 'viewers[]';
+            checkbox.value = user.email;
+            checkbox.id = `viewer_${index + 1}`;
+            checkbox.checked = selectedEmails.has(user.email);
+            
+            const label = document.createElement('label');
+            label.className = 'form-check-label';
+            label.htmlFor = checkbox.id;
+            const displayText = document.createElement('span');
+            displayText.className = 'user-display-text';
+            displayText.textContent = `${user.name} (${user.email})`;
+            label.appendChild(displayText);
+            
+            item.appendChild(checkbox);
+            item.appendChild(label);
+            userList.insertBefore(item, noResults);
+        });
+        
+        userItems = userList.querySelectorAll('.user-item');
+        totalUsers = userItems.length;
+        userCounter.textContent = totalUsers > 0
+            ? `${totalUsers} usuário(s) disponível(is)`
+            : 'Nenhum usuário encontrado. Verifique a conexão com o Connect.';
+        
+        if (totalUsers > 0) {
+            // Campo vazio que garante viewers[] no POST mesmo com todos desmarcados
+            // (gerenciar visualizadores recusa o envio sem o campo, ou seja, sem a lista carregada)
+            const marker = document.createElement('input');
+            marker.type = 'hidden';
+            marker.name = 'viewers[]';
+            marker.value = '';
+            userList.appendChild(marker);
+            submitBtn.disabled = false;
+        }
+    }
+    
+    fetch(userList.getAttribute('data-src'), { headers: { 'Accept': 'application/json' } })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        })
+        .then(renderUsers)
+        .catch(() => {
+            if (requireList) {
+                submitBtn.disabled = true;
+            }
+            userCounter.textContent = 'Erro ao carregar lista de usuários. Tente novamente.';
+        });
+    
+    function filterUsers() {
+        const searchTerm = searchInput.value.toLowerCase().trim();
+        let visibleCount = 0;
+        
+        if (searchTerm === '') {
+            clearBtn.classList.remove('active');
+            userItems.forEach(item => {
+                item.classList.remove('hidden');
+                const displayText = item.querySelector('.user-display-text');
+                const originalText = displayText.textContent;
+                displayText.innerHTML = originalText;
+            });
+            visibleCount = totalUsers;
+            noResults.classList.remove('active');
+        } else {
+            clearBtn.classList.add('active');
+            
+            userItems.forEach(item => {
+                const userName = item.getAttribute('data-user-name');
+                const userEmail = item.getAttribute('data-user-email');
+                const displayText = item.querySelector('.user-display-text');
+                const originalText = displayText.textContent;
+                
+                if (userName.includes(searchTerm) || userEmail.includes(searchTerm)) {
+                    item.classList.remove('hidden');
+                    visibleCount++;
+                    
+                    const regex = new RegExp(`(${searchTerm})`, 'gi');
+                    const highlightedText = originalText.replace(regex, '<span class="highlight">$1</span>');
+                    displayText.innerHTML = highlightedText;
+                } else {
+                    item.classList.add('hidden');
+                    displayText.innerHTML = originalText;
+                }
+            });
+            
+            if (visibleCount === 0) {
+                noResults.classList.add('active');
+            } else {
+                noResults.classList.remove('active');
+            }
+        }
+        
+        userCounter.textContent = `${visibleCount} usuário(s) encontrado(s)`;
+    }
+    
+    function clearSearch() {
+        searchInput.value = '';
+        filterUsers();
+        searchInput.focus();
+    }
+    
+    searchInput.addEventListener('input', filterUsers);
+    searchInput.addEventListener('keyup', function(e) {
+        if (e.key === 'Escape') {
+            clearSearch();
+        }
+    });
+    
+    clearBtn.addEventListener('click', clearSearch);
+});
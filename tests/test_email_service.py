@@ -0,0 +1,115 @@
+"""
+Testes do envio SMTP com PIPELINING (_send_smtp_message) contra um servidor simulado
+"""
+
+import os
+import smtplib
+import unittest
+from email.mime.text import MIMEText
+
+# O pacote app.services carrega o serviço de tokens, que exige a chave do Connect
+os.environ.setdefault('CONNECT_SECRET_KEY', 'y' * 40)
+
+from app.services.email_service import _send_smtp_message
+
+
+class FakeSMTP:
+    """
+    Servidor SMTP simulado: registra o que foi enviado e devolve as respostas
+    programadas, na ordem, a cada getreply()
+    """
+    
+    def __init__(self, replies=(), pipelining=True):
+        self.replies = list(replies)
+        self.pipelining = pipelining
+        self.sent = b''
+        self.sent_messages = []
+        self.rset_count = 0
+    
+    def has_extn(self, name):
+        return name == 'pipelining' and self.pipelining
+    
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        self.sent += data
+    
+    def getreply(self):
+        return self.replies.pop(0)
+    
+    def rset(self):
+        self.rset_count += 1
+    
+    def send_message(self, message):
+        self.sent_messages.append(message)
+
+
+def _message(body='Corpo do email', to_email='destino@example.com', from_email='origem@example.com'):
+    message = MIMEText(body, 'plain', 'utf-8')
+    message['From'] = from_email
+    message['To'] = to_email
+    message['Subject'] = 'Assunto'
+    return message
+
+
+class SendSMTPMessageTest(unittest.TestCase):
+
+    def test_pipelined_success(self):
+        server = FakeSMTP([(250, b'OK'), (250, b'OK'), (354, b'Go ahead'), (250, b'Queued')])
+        
+        _send_smtp_message(server, _message())
+        
+        self.assertTrue(server.sent.startswith(
+            b'MAIL FROM:<origem@example.com>\r\nRCPT TO:<destino@example.com>\r\nDATA\r\n'
+        ))
+        self.assertTrue(server.sent.endswith(b'\r\n.\r\n'))
+        self.assertEqual(server.replies, [])
+        self.assertEqual(server.rset_count, 0)
+        self.assertEqual(server.sent_messages, [])
+    
+    def test_recipient_refused(self):
+        # Destinatário recusado: o servidor responde 554 também ao DATA
+        server = FakeSMTP([(250, b'OK'), (550, b'No such user'), (554, b'No valid recipients')])
+        
+        with self.assertRaises(smtplib.SMTPRecipientsRefused) as ctx:
+            _send_smtp_message(server, _message())
+        
+        self.assertEqual(ctx.exception.recipients, {'destino@example.com': (550, b'No such user')})
+        self.assertEqual(server.rset_count, 1)
+        self.assertNotIn(b'\r\n.\r\n', server.sent)
+    
+    def test_lines_starting_with_dot_are_stuffed(self):
+        server = FakeSMTP([(250, b'OK'), (250, b'OK'), (354, b'Go ahead'), (250, b'Queued')])
+        message = MIMEText('Primeira linha\n.\n.linha com ponto', 'plain', 'us-ascii')
+        message['From'] = 'origem@example.com'
+        message['To'] = 'destino@example.com'
+        
+        _send_smtp_message(server, message)
+        
+        data = server.sent.split(b'DATA\r\n', 1)[1]
+        self.assertIn(b'\r\n..\r\n', data)
+        self.assertIn(b'\r\n..linha com ponto\r\n', data)
+        self.assertTrue(data.endswith(b'\r\n.\r\n'))
+    
+    def test_without_pipelining_uses_send_message(self):
+        server = FakeSMTP(pipelining=False)
+        message = _message()
+        
+        _send_smtp_message(server, message)
+        
+        self.assertEqual(server.sent_messages, [message])
+        self.assertEqual(server.sent, b'')
+    
+    def test_non_ascii_address_uses_send_message(self):
+        # Endereço internacionalizado: o send_message negocia SMTPUTF8
+        server = FakeSMTP()
+        message = _message(to_email='joão@example.com')
+        
+        _send_smtp_message(server, message)
+        
+        self.assertEqual(server.sent_messages, [message])
+        self.assertEqual(server.sent, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()